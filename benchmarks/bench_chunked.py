@@ -0,0 +1,30 @@
+"""
+Peak memory and time of building an `ImageGrid` from a memory-mapped
+``.npy`` file, loading it whole or in chunks, with a memory-mapped canvas.
+"""
+from __future__ import division, print_function, absolute_import
+
+import os
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import vzlog
+
+tmp = tempfile.mkdtemp()
+path = os.path.join(tmp, 'patches.npy')
+rs = np.random.RandomState(0)
+np.save(path, rs.uniform(size=(20000, 16, 16)).astype(np.float32))
+data = np.load(path, mmap_mode='r')
+
+print('{:>10} {:>10} {:>14}'.format('chunk', 'time (s)', 'peak (MB)'))
+for chunk_size in [None, 4096, 512]:
+    tracemalloc.start()
+    t0 = time.time()
+    vzlog.image.ImageGrid(data, dtype=np.uint8, chunk_size=chunk_size,
+                          out=os.path.join(tmp, 'canvas.npy'))
+    t = time.time() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('{:>10} {:>10.2f} {:>14.1f}'.format(str(chunk_size), t,
+                                              peak / 2**20))
@@ -0,0 +1,30 @@
+"""
+Colormapping a stack of patches into an `ImageGrid` canvas with each backend
+of `colormap_windows`. The Cython kernel writes straight into the canvas,
+while the NumPy backend gathers the LUT into a temporary stack and then
+places it.
+"""
+from __future__ import division, print_function, absolute_import
+
+import timeit
+import numpy as np
+import vzlog
+
+rs = np.random.RandomState(0)
+
+print('{:>16} {:>8} {:>12} {:>12} {:>8}'.format(
+    'patches', 'dtype', 'cython (ms)', 'numpy (ms)', 'speedup'))
+for N, size in [(64, 8), (1024, 16), (4096, 32)]:
+    data = rs.uniform(size=(N, size, size))
+    for dtype in [np.float64, np.float32, np.uint8]:
+        grid = vzlog.image.ImageGrid(data, dtype=dtype)
+        times = []
+        for name in ['cython', 'numpy']:
+            vzlog.image.set_backend(name)
+            n = 5
+            times.append(timeit.timeit(lambda: grid._set_images(data),
+                                       number=n) / n)
+        print('{:>16} {:>8} {:>12.2f} {:>12.2f} {:>7.1f}x'.format(
+            '{}x{}x{}'.format(N, size, size), np.dtype(dtype).name,
+            times[0] * 1000, times[1] * 1000, times[1] / times[0]))
+vzlog.image.set_backend()
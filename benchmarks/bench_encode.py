@@ -0,0 +1,54 @@
+"""
+Encoding time and file size of image grids for different formats and
+encoder options of `ImageGrid.save`.
+"""
+from __future__ import division, print_function, absolute_import
+
+import io
+import timeit
+import numpy as np
+import vzlog
+
+rs = np.random.RandomState(0)
+
+# Smooth filters, like learned weights, and noisy patches
+x = np.linspace(-3, 3, 24)
+smooth = np.exp(-(x[:, np.newaxis] ** 2 + x ** 2) /
+                rs.uniform(1, 8, size=(256, 1, 1)))
+grids = [
+    ('smooth 256x24x24 x3', vzlog.image.ImageGrid(smooth), 3),
+    ('noise 256x24x24 x3', vzlog.image.ImageGrid(
+        rs.uniform(size=(256, 24, 24))), 3),
+    ('color 64x32x32x3 x4', vzlog.image.ColorImageGrid(
+        rs.uniform(size=(64, 32, 32, 3))), 4),
+]
+
+settings = [
+    ('png', dict(compress_level=6)),
+    ('png', dict(compress_level=1)),
+    ('png', dict(compress_level=1, compress_type=3)),
+    ('png', dict(compress_level=0)),
+    ('webp', dict(lossless=True, method=0)),
+    ('webp', dict(lossless=True, method=4)),
+    ('jpeg', dict(quality=90)),
+]
+
+
+def encode(grid, scale, fmt, options):
+    b = io.BytesIO()
+    grid.save(b, scale=scale, format=fmt, **options)
+    return b.getvalue()
+
+
+print('{:<22} {:<6} {:<36} {:>9} {:>9}'.format(
+    'grid', 'format', 'options', 'time (ms)', 'size (kB)'))
+for name, grid, scale in grids:
+    for fmt, options in settings:
+        n = 5
+        t = timeit.timeit(lambda: encode(grid, scale, fmt, options),
+                          number=n) / n
+        size = len(encode(grid, scale, fmt, options))
+        opts = ', '.join('{}={}'.format(k, v)
+                         for k, v in sorted(options.items()))
+        print('{:<22} {:<6} {:<36} {:>9.1f} {:>9.1f}'.format(
+            name, fmt, opts, t * 1000, size / 1000))
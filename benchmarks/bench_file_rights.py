@@ -0,0 +1,33 @@
+"""
+Measures the cost per image of `impath` with file rights, to check that it
+scales linearly with the number of logged images.
+"""
+from __future__ import division, print_function, absolute_import
+
+import os
+import tempfile
+import time
+import vzlog
+
+root = tempfile.mkdtemp()
+print('{:>8} {:>12} {:>10}'.format('images', 'total (s)', 'us / image'))
+for n in [1000, 10000, 50000]:
+    vz = vzlog.VzLog(os.path.join(root, 'log-{}'.format(n)),
+                     file_rights='644')
+    skipped = []
+    t0 = time.time()
+    for i in range(n):
+        path = vz.impath('png')
+        # Write every other file, so that pending files accumulate
+        if i % 2 == 0:
+            open(path, 'wb').close()
+        else:
+            skipped.append(path)
+    vz._update_rights()
+    t1 = time.time()
+    print('{:>8} {:>12.2f} {:>10.1f}'.format(n, t1 - t0, (t1 - t0) / n * 1e6))
+
+    # Write the rest, so that the log has no pending files at exit
+    for path in skipped:
+        open(path, 'wb').close()
+    vz.flush()
@@ -0,0 +1,44 @@
+"""
+Construction time of `ImageGrid` and `ColorImageGrid`, which share the
+placement path, compared with setting each window with `set_image`, and
+the time to produce the 8-bit image of each.
+"""
+from __future__ import division, print_function, absolute_import
+
+import timeit
+import numpy as np
+import vzlog
+
+rs = np.random.RandomState(0)
+cases = [
+    ('ImageGrid', vzlog.image.ImageGrid, rs.uniform(size=(1024, 16, 16))),
+    ('ColorImageGrid', vzlog.image.ColorImageGrid,
+     rs.uniform(size=(1024, 16, 16, 3))),
+]
+
+
+def per_window(cls, data, dtype):
+    grid = cls(rows=32, cols=32, shape=data.shape[1:3], dtype=dtype)
+    for i, image in enumerate(data):
+        grid.set_image(image, i // 32, i % 32)
+    return grid
+
+
+def to_pil(grid):
+    return grid.pil_image(1)
+
+
+print('{:<16} {:<8} {:>12} {:>12} {:>8} {:>12}'.format(
+    'grid', 'dtype', 'loop (ms)', 'batch (ms)', 'speedup', 'uint8 (ms)'))
+for name, cls, data in cases:
+    for dtype in [np.float64, np.float32, np.uint8]:
+        n = 3
+        t_loop = timeit.timeit(lambda: per_window(cls, data, dtype),
+                               number=n) / n
+        t_batch = timeit.timeit(lambda: cls(data, dtype=dtype),
+                                number=n) / n
+        grid = cls(data, dtype=dtype)
+        t_pil = timeit.timeit(lambda: to_pil(grid), number=n) / n
+        print('{:<16} {:<8} {:>12.1f} {:>12.1f} {:>7.1f}x {:>12.1f}'.format(
+            name, np.dtype(dtype).name, t_loop * 1000, t_batch * 1000,
+            t_loop / t_batch, t_pil * 1000))
@@ -0,0 +1,34 @@
+"""
+Measures the import time of vzlog in a fresh interpreter, for text-only
+logging and for logging image grids.
+"""
+from __future__ import division, print_function, absolute_import
+
+import subprocess
+import sys
+
+STATEMENTS = [
+    ('text only', 'import vzlog'),
+    ('image grids', 'import vzlog; vzlog.ImageGrid'),
+    ('pyplot', 'import vzlog.pyplot'),
+]
+
+TIMER = """
+import sys, time
+t0 = time.time()
+{}
+t1 = time.time()
+print((t1 - t0) * 1000, 'numpy' in sys.modules, 'matplotlib' in sys.modules)
+"""
+
+print('{:<12} {:>10} {:>6} {:>11}'.format('', 'time (ms)', 'numpy',
+                                          'matplotlib'))
+for name, statement in STATEMENTS:
+    runs = []
+    for _ in range(5):
+        out = subprocess.check_output([sys.executable, '-c',
+                                       TIMER.format(statement)])
+        runs.append(out.decode().split())
+    best = min(runs, key=lambda r: float(r[0]))
+    print('{:<12} {:>10.1f} {:>6} {:>11}'.format(name, float(best[0]),
+                                                 best[1], best[2]))
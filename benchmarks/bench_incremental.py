@@ -0,0 +1,40 @@
+"""
+Cost of updating a few windows of a large `ImageGrid` and producing the
+upscaled 8-bit image again, as done when saving it every epoch. The first
+column rebuilds the scaled canvas from scratch, the second reuses the
+cached one and only recomputes the changed windows.
+"""
+from __future__ import division, print_function, absolute_import
+
+import timeit
+import numpy as np
+import vzlog
+
+rs = np.random.RandomState(0)
+grid = vzlog.image.ImageGrid(rs.uniform(size=(1024, 16, 16)),
+                             cache_scaled=True)
+scale = 4
+
+print('{:>8} {:>12} {:>12} {:>8}'.format('changed', 'full (ms)',
+                                         'cached (ms)', 'speedup'))
+for changed in [1, 8, 64, 256]:
+    def update():
+        for i in rs.randint(1024, size=changed):
+            grid.set_image(rs.uniform(size=(16, 16)), i // 32, i % 32)
+
+    def full():
+        update()
+        grid.invalidate()
+        grid.pil_image(scale)
+
+    def cached():
+        update()
+        grid.pil_image(scale)
+
+    n = 10
+    grid.pil_image(scale)
+    t_full = timeit.timeit(full, number=n) / n
+    grid.pil_image(scale)
+    t_cached = timeit.timeit(cached, number=n) / n
+    print('{:>8} {:>12.2f} {:>12.2f} {:>7.1f}x'.format(
+        changed, t_full * 1000, t_cached * 1000, t_full / t_cached))
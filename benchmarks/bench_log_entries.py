@@ -0,0 +1,30 @@
+"""
+Measures the overhead of logging a text entry, for a few flush policies of
+the HTML page.
+"""
+from __future__ import division, print_function, absolute_import
+
+import tempfile
+import time
+import os
+import vzlog
+
+POLICIES = [
+    ('every entry', dict(flush_entries=1)),
+    ('every 100 entries', dict(flush_entries=100, flush_seconds=None)),
+    ('64 KiB / 1 s (default)', dict()),
+]
+
+N = 20000
+
+root = tempfile.mkdtemp()
+print('{:<24} {:>12}'.format('policy', 'us / entry'))
+for no, (name, policy) in enumerate(POLICIES):
+    vz = vzlog.VzLog(os.path.join(root, 'log-{}'.format(no)), **policy)
+    t0 = time.time()
+    for i in range(N):
+        vz.log('Iteration', i, 'loss', 0.1)
+    vz.flush()
+    t1 = time.time()
+    print('{:<24} {:>12.2f}'.format(name, (t1 - t0) / N * 1e6))
+    vz._finalize()
@@ -0,0 +1,39 @@
+"""
+Filling an `ImageGrid` one window at a time with `set_image`, with the
+colormap lookup tables taken from the cache compared with rebuilding them
+for every call, and the cost of finer lookup tables.
+"""
+from __future__ import division, print_function, absolute_import
+
+import timeit
+import numpy as np
+import matplotlib
+import vzlog
+from vzlog.image import image_grid
+
+rs = np.random.RandomState(0)
+
+
+def fill(grid, data, cmap, levels, clear):
+    for k, image in enumerate(data):
+        if clear:
+            image_grid._lut_cache.clear()
+        grid.set_image(image, k // grid._cols, k % grid._cols, cmap=cmap,
+                       levels=levels)
+
+
+N, size = 256, 16
+data = rs.uniform(size=(N, size, size))
+print('{:>8} {:>8} {:>14} {:>12} {:>8}'.format(
+    'levels', 'dtype', 'uncached (ms)', 'cached (ms)', 'speedup'))
+for levels in [256, 4096]:
+    cmap = matplotlib.colormaps['viridis'].resampled(levels)
+    for dtype in [np.float32, np.uint8]:
+        grid = vzlog.image.ImageGrid(rows=16, cols=16, shape=(size, size),
+                                     dtype=dtype)
+        n = 3
+        times = [timeit.timeit(lambda: fill(grid, data, cmap, levels, clear),
+                               number=n) / n for clear in [True, False]]
+        print('{:>8} {:>8} {:>14.2f} {:>12.2f} {:>7.1f}x'.format(
+            levels, np.dtype(dtype).name, times[0] * 1000, times[1] * 1000,
+            times[0] / times[1]))
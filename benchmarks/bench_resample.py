@@ -0,0 +1,33 @@
+"""
+Compares the Cython kernel `resample_and_arrange_image` against its NumPy
+implementation in `vzlog.image.resample_numpy`, for float64 and uint8
+output. Large images use a thread per block of rows if the extension was
+built with OpenMP (set ``OMP_NUM_THREADS`` to vary it).
+"""
+from __future__ import division, print_function, absolute_import
+
+import timeit
+import numpy as np
+from vzlog.image import resample, resample_numpy
+
+rs = np.random.RandomState(0)
+lut = rs.uniform(size=(256, 4))
+luts = {'float64': (lut, np.nan), 'uint8': ((lut * 255).astype(np.uint8), 0)}
+
+print('{:>12} {:>8} {:>12} {:>12} {:>8}'.format(
+    'size', 'output', 'cython (ms)', 'numpy (ms)', 'speedup'))
+for size, target in [(16, 16), (256, 256), (256, 1024), (2048, 2048)]:
+    image = rs.randint(0, 256, size=(size, size)).astype(np.uint8)
+    nan_mask = (rs.uniform(size=(size, size)) < 0.01).astype(np.uint8)
+    for name, (lut, nan_color) in sorted(luts.items()):
+        args = (image, nan_mask, (target, target), lut, nan_color)
+        n = max(1, 2 * 10**7 // target**2)
+        t_cy = timeit.timeit(
+            lambda: resample.resample_and_arrange_image(*args),
+            number=n) / n
+        t_np = timeit.timeit(
+            lambda: resample_numpy.resample_and_arrange_image(*args),
+            number=n) / n
+        print('{:>12} {:>8} {:>12.3f} {:>12.3f} {:>7.1f}x'.format(
+            '{0}->{1}'.format(size, target), name, t_cy * 1000,
+            t_np * 1000, t_np / t_cy))
@@ -0,0 +1,35 @@
+"""
+Compares nearest-neighbor upscaling in `ImageGrid.scaled_image` against
+``skimage.transform.resize(..., order=0)``, which it replaced.
+"""
+from __future__ import division, print_function, absolute_import
+
+import timeit
+import numpy as np
+import vzlog
+
+rs = np.random.RandomState(0)
+grid = vzlog.image.ImageGrid(rs.uniform(size=(256, 16, 16)))
+
+try:
+    from skimage.transform import resize
+except ImportError:
+    resize = None
+
+print('{:>6} {:>12} {:>12} {:>8}'.format('scale', 'vzlog (ms)', 'skimage (ms)',
+                                         'speedup'))
+for scale in [2, 3, 5, 8]:
+    n = 10
+    t_vz = timeit.timeit(lambda: grid.scaled_image(scale), number=n) / n
+    if resize is not None:
+        data = grid.image
+        shape = (data.shape[0] * scale, data.shape[1] * scale)
+        assert np.array_equal(resize(data, shape, order=0),
+                              grid.scaled_image(scale))
+        t_sk = timeit.timeit(lambda: resize(data, shape, order=0),
+                             number=n) / n
+        print('{:>6} {:>12.2f} {:>12.2f} {:>7.1f}x'.format(
+            scale, t_vz * 1000, t_sk * 1000, t_sk / t_vz))
+    else:
+        print('{:>6} {:>12.2f} {:>12} {:>8}'.format(scale, t_vz * 1000,
+                                                    '-', '-'))
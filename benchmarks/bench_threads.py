@@ -0,0 +1,35 @@
+"""
+Measures logging throughput of a thread-safe `VzLog` with several threads
+logging at the same time.
+"""
+from __future__ import division, print_function, absolute_import
+
+import os
+import tempfile
+import threading
+import time
+import vzlog
+
+N = 5000
+
+root = tempfile.mkdtemp()
+print('{:>8} {:>14}'.format('threads', 'entries / s'))
+for threads in [1, 8, 16, 32]:
+    vz = vzlog.VzLog(os.path.join(root, 'log-{}'.format(threads)),
+                     threadsafe=True)
+
+    def work(no):
+        for i in range(N):
+            vz.log('Thread', no, 'entry', i)
+
+    pool = [threading.Thread(target=work, args=(no,))
+            for no in range(threads)]
+    t0 = time.time()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    vz._drain()
+    t1 = time.time()
+    print('{:>8} {:>14.0f}'.format(threads, threads * N / (t1 - t0)))
+    vz._finalize()
@@ -1,8 +1,9 @@
 #!/usr/bin/env python
 from __future__ import division, print_function, absolute_import
 
-from setuptools import setup
+from setuptools import setup, Extension
 import os
+import sys
 
 if os.getenv('READTHEDOCS'):
     with open('requirements_docs.txt') as f:
@@ -42,9 +43,61 @@ args = dict(
     classifiers=CLASSIFIERS,
 )
 
+
+def openmp_flags():
+    """
+    Extension arguments for OpenMP, or none if the compiler cannot build and
+    link a program that uses it (e.g. Apple clang), in which case the
+    resample kernels are built serial.
+    """
+    import shutil
+    import tempfile
+    from distutils.ccompiler import new_compiler
+    from distutils.errors import CompileError, LinkError
+    from distutils.sysconfig import customize_compiler
+
+    if sys.platform == 'win32':
+        flags = dict(extra_compile_args=['/openmp'])
+    else:
+        flags = dict(extra_compile_args=['-fopenmp'],
+                     extra_link_args=['-fopenmp'])
+
+    compiler = new_compiler()
+    customize_compiler(compiler)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        src = os.path.join(tmp_dir, 'openmp_probe.c')
+        with open(src, 'w') as f:
+            f.write('#include <omp.h>\n'
+                    'int main(void) { return omp_get_max_threads() < 1; }\n')
+        objects = compiler.compile(
+            [src], output_dir=tmp_dir,
+            extra_postargs=flags['extra_compile_args'])
+        compiler.link_executable(
+            objects, os.path.join(tmp_dir, 'openmp_probe'),
+            extra_postargs=flags.get('extra_link_args'))
+    except (CompileError, LinkError):
+        print('OpenMP is not available, building the resample kernels '
+              'serial')
+        return {}
+    finally:
+        shutil.rmtree(tmp_dir)
+    return flags
+
+
 if compile_ext:
+    # The resample kernels run in parallel with OpenMP where the compiler
+    # supports it. The extension is optional, since vzlog falls back to
+    # NumPy kernels without it.
+    openmp = openmp_flags()
     args['setup_requires'] = ['numpy', 'cython']
-    args['ext_modules'] = cythonize("vzlog/image/resample.pyx")
+    args['ext_modules'] = cythonize([
+        Extension('vzlog.image.resample', ['vzlog/image/resample.pyx'],
+                  include_dirs=[np.get_include()], **openmp),
+    ])
+    # cythonize drops the optional flag of the extensions it is given
+    for ext in args['ext_modules']:
+        ext.optional = True
     args['include_dirs'] = [np.get_include()]
 
 setup(**args)
@@ -0,0 +1,178 @@
+from __future__ import division, print_function, absolute_import
+
+import numpy as np
+import pytest
+from matplotlib import cm
+
+import vzlog
+from vzlog.image import ImageGrid, ColorImageGrid, resample_numpy
+from vzlog.image.color_image_grid import _as_pixels
+
+DTYPES = [np.float64, np.float32, np.uint8]
+
+
+def _data(shape, seed=0, nans=True):
+    rs = np.random.RandomState(seed)
+    data = rs.normal(size=shape)
+    if nans:
+        data.flat[::17] = np.nan
+    return data
+
+
+def _per_window(cls, data, rows, cols, **kwargs):
+    """
+    Builds a grid window by window with `set_image`, as the reference for
+    the batched constructor.
+    """
+    options = {k: kwargs.pop(k) for k in ('vmin', 'vmax', 'vsym', 'cmap')
+               if k in kwargs}
+    grid = cls(rows=rows, cols=cols, shape=data.shape[1:3], **kwargs)
+    for i, image in enumerate(data[:rows * cols]):
+        grid.set_image(image, i // cols, i % cols, **options)
+    return grid
+
+
+@pytest.mark.parametrize('dtype', DTYPES)
+@pytest.mark.parametrize('vsym', [False, True])
+@pytest.mark.parametrize('border_width', [None, 0, 2])
+@pytest.mark.parametrize('rows,cols', [(None, None), (2, 5), (4, 4)])
+def test_image_grid_matches_set_image(dtype, vsym, border_width, rows,
+                                      cols):
+    data = _data((11, 5, 6))
+    grid = ImageGrid(data, rows=rows, cols=cols, vsym=vsym,
+                     global_bounds=False, border_width=border_width,
+                     dtype=dtype)
+    ref = _per_window(ImageGrid, data, grid._rows, grid._cols, vmin=None,
+                      vmax=None, vsym=vsym, border_width=border_width,
+                      dtype=dtype)
+    np.testing.assert_array_equal(grid.image, ref.image)
+
+
+@pytest.mark.parametrize('dtype', DTYPES)
+@pytest.mark.parametrize('channels', [1, 2, 3])
+@pytest.mark.parametrize('bounds', [(0.0, 1.0), (None, None), (-1.0, 2.0)])
+@pytest.mark.parametrize('vsym', [False, True])
+@pytest.mark.parametrize('border_color', [1, 0.5, (1.0, 0.0, 0.0)])
+def test_color_image_grid_matches_set_image(dtype, channels, bounds, vsym,
+                                            border_color):
+    data = _data((7, 4, 3, channels), nans=False)
+    vmin, vmax = bounds
+    grid = ColorImageGrid(data, vmin=vmin, vmax=vmax, vsym=vsym,
+                          global_bounds=False, border_color=border_color,
+                          dtype=dtype)
+    ref = _per_window(ColorImageGrid, data, grid._rows, grid._cols,
+                      vmin=vmin, vmax=vmax, vsym=vsym,
+                      border_color=border_color, dtype=dtype)
+    np.testing.assert_array_equal(grid.image, ref.image)
+
+
+@pytest.mark.parametrize('vsym', [False, True])
+@pytest.mark.parametrize('border_width', [0, 1, 3])
+def test_canvas_dtypes_agree(vsym, border_width):
+    data = _data((9, 6, 6))
+    color_data = _data((9, 6, 6, 3), nans=False)
+    for cls, d in [(ImageGrid, data), (ColorImageGrid, color_data)]:
+        grids = [cls(d, vmin=None, vmax=None, vsym=vsym,
+                     border_width=border_width, dtype=dtype)
+                 for dtype in DTYPES]
+        for grid in grids[1:]:
+            np.testing.assert_array_equal(
+                grid.image, _as_pixels(grids[0].image, grid._dtype))
+
+
+@pytest.mark.parametrize('dtype', DTYPES)
+@pytest.mark.parametrize('global_bounds', [False, True])
+def test_gray_image_grid_matches_grayscale_color_image_grid(dtype,
+                                                             global_bounds):
+    # The colormap quantizes to 256 levels, so they agree to one level
+    data = _data((10, 5, 5), nans=False)
+    grid = ImageGrid(data, cmap=cm.gray, vmin=None, vmax=None,
+                     global_bounds=global_bounds, dtype=dtype)
+    color_grid = ColorImageGrid(data[..., np.newaxis], vmin=None, vmax=None,
+                                global_bounds=global_bounds, dtype=dtype)
+    tolerance = 1 if dtype == np.uint8 else 1 / 255 + 1e-6
+    diff = np.abs(grid.image.astype(np.float64) - color_grid.image)
+    assert diff.max() <= tolerance
+
+
+def test_chunked_grid_matches_whole():
+    data = _data((23, 4, 4))
+    for cls, d in [(ImageGrid, data), (ColorImageGrid, data[..., None])]:
+        whole = cls(d, vmin=None, vmax=None)
+        chunked = cls(d, vmin=None, vmax=None, chunk_size=5)
+        np.testing.assert_array_equal(whole.image, chunked.image)
+
+
+def test_unknown_keyword_is_rejected():
+    with pytest.raises(TypeError):
+        ColorImageGrid(rows=2, cols=2, shape=(3, 3), cmap=cm.gray)
+    with pytest.raises(TypeError):
+        ImageGrid(_data((4, 3, 3)), colormap=cm.gray)
+
+
+@pytest.fixture
+def cython_kernels():
+    kernels = pytest.importorskip('vzlog.image.resample')
+    yield kernels
+    vzlog.image.set_backend()
+
+
+@pytest.mark.parametrize('dtype', DTYPES)
+@pytest.mark.parametrize('vsym', [False, True])
+def test_backends_agree(cython_kernels, dtype, vsym):
+    data = _data((13, 7, 5))
+    grids = []
+    for name in ['cython', 'numpy']:
+        vzlog.image.set_backend(name)
+        grid = ImageGrid(data, vsym=vsym, dtype=dtype)
+        grid.set_image(data[3], 0, 1, cmap=cm.viridis)
+        grids.append(grid)
+    np.testing.assert_array_equal(grids[0].image, grids[1].image)
+
+
+@pytest.mark.parametrize('dtype', DTYPES)
+@pytest.mark.parametrize('size', [(6, 4), (12, 9), (3, 2)])
+@pytest.mark.parametrize('levels', [256, 4096])
+def test_colormap_windows_kernels_agree(cython_kernels, dtype, size,
+                                        levels):
+    rs = np.random.RandomState(0)
+    index_dtype = np.uint8 if levels <= 256 else np.uint16
+    indices = rs.randint(0, levels, size=(5, 6, 4)).astype(index_dtype)
+    nan_mask = rs.uniform(size=indices.shape) < 0.1
+    lut = _as_pixels(rs.uniform(size=(levels, 3)), dtype)
+    nan_color = _as_pixels(np.array([1.0, 0.0, 0.5]), dtype)
+    h, w = size
+    canvases = [np.zeros((1 + 3 * (h + 1), 1 + 4 * (w + 1), 3), dtype=dtype)
+                for _ in range(2)]
+    for kernels, canvas in zip([cython_kernels, resample_numpy], canvases):
+        kernels.colormap_windows(indices, nan_mask, lut, nan_color, canvas,
+                                 size, 1, 4, first=2)
+    np.testing.assert_array_equal(canvases[0], canvases[1])
+
+
+@pytest.mark.parametrize('lut_dtype', [np.float64, np.uint8])
+def test_resample_kernels_agree(cython_kernels, lut_dtype):
+    rs = np.random.RandomState(0)
+    image = rs.randint(0, 256, size=(9, 7)).astype(np.uint8)
+    nan_mask = (rs.uniform(size=image.shape) < 0.1).astype(np.uint8)
+    lut = _as_pixels(rs.uniform(size=(256, 4)), lut_dtype)
+    nan_color = None if lut_dtype == np.float64 else 255
+    for target in [(9, 7), (20, 15), (4, 3)]:
+        expected = cython_kernels.resample_and_arrange_image(
+            image, nan_mask, target, lut, nan_color)
+        actual = resample_numpy.resample_and_arrange_image(
+            image, nan_mask, target, lut, nan_color)
+        assert actual.dtype == expected.dtype
+        np.testing.assert_array_equal(actual, expected)
+
+
+@pytest.mark.parametrize('cmap', [cm.gray, cm.viridis, cm.RdBu_r])
+def test_more_levels_give_more_colors(cmap):
+    ramp = np.linspace(0, 1, 4096).reshape(1, 64, 64)
+
+    def distinct_colors(levels):
+        grid = ImageGrid(ramp, cmap=cmap, levels=levels)
+        return len(np.unique(grid.image.reshape(-1, 3), axis=0))
+
+    assert distinct_colors(256) == 256
+    assert distinct_colors(4096) > 1024
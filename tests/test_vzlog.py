@@ -0,0 +1,313 @@
+from __future__ import division, print_function, absolute_import
+
+import base64
+import os
+import re
+import subprocess
+import sys
+import textwrap
+import threading
+
+import numpy as np
+import pytest
+
+import vzlog
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(vzlog.__file__)))
+
+
+def _run_script(script, *args):
+    """
+    Runs a script in a new interpreter, so that the log is finalized by its
+    `atexit` handler, and checks that it printed nothing to stderr.
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    proc = subprocess.run([sys.executable, '-c', textwrap.dedent(script)] +
+                          [str(arg) for arg in args],
+                          env=env, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+    assert proc.returncode == 0 and proc.stderr == '', proc.stderr
+
+
+@pytest.mark.parametrize('pool_started', [False, True])
+def test_thumbnails_made_at_exit(tmp_path, pool_started):
+    # The image written by the caller is still waiting for its thumbnail
+    # when the process exits
+    path = tmp_path / 'log'
+    _run_script('''
+        import sys
+        import numpy as np
+        import vzlog
+        vz = vzlog.VzLog(sys.argv[1], workers=2, thumbnails=32)
+        if sys.argv[2] == 'True':
+            vz.image(np.zeros((4, 4)))
+        grid = vzlog.image.ImageGrid(np.random.rand(4, 8, 8))
+        grid.save(vz.impath('png'))
+        ''', path, pool_started)
+    n = 1 if pool_started else 0
+    assert (path / 'plot-{:04}.thumb.png'.format(n)).exists()
+
+
+def _read(path):
+    with open(str(path), encoding='utf-8') as f:
+        return f.read()
+
+
+def _assert_complete(html):
+    assert html.count('</html>') == 1
+    assert html.rstrip().endswith('</body>\n</html>')
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / 'log'
+
+
+def test_page_is_complete_after_each_flush(path):
+    vz = vzlog.VzLog(str(path), flush_entries=1)
+    for i in range(3):
+        vz.log('entry', i)
+        html = _read(path / 'index.html')
+        _assert_complete(html)
+        assert html.count('<pre>') == i + 1
+    vz.close()
+
+
+def test_flush_thresholds_can_be_disabled(path):
+    vz = vzlog.VzLog(str(path), flush_entries=None, flush_seconds=None,
+                     flush_bytes=None)
+    for i in range(10):
+        vz.log(i)
+    assert '<pre>' not in _read(path / 'index.html')
+    vz.flush()
+    html = _read(path / 'index.html')
+    _assert_complete(html)
+    assert html.count('<pre>') == 10
+    vz.close()
+
+
+def test_held_back_entry_keeps_one_timer(path, monkeypatch):
+    # While an image is being encoded, the entries after it wait, and the
+    # buffered size stays above flush_bytes
+    release = threading.Event()
+    encode = vzlog.vzlog._encode_array
+
+    def slow_encode(*args):
+        release.wait()
+        return encode(*args)
+
+    monkeypatch.setattr(vzlog.vzlog, '_encode_array', slow_encode)
+    vz = vzlog.VzLog(str(path), workers=1, embed_bytes=10**6, flush_bytes=1)
+    vz.image(np.zeros((4, 4)))
+    threads = threading.active_count()
+    for i in range(500):
+        vz.log(i)
+    assert threading.active_count() <= threads + 1
+    assert '<pre>' not in _read(path / 'index.html')
+    release.set()
+    vz.flush()
+    html = _read(path / 'index.html')
+    assert html.count('<pre>') == 500
+    assert html.index('data:image/png') < html.index('<pre>')
+    vz.close()
+
+
+def test_file_rights_are_batched(path, monkeypatch):
+    calls = []
+    chmod = os.chmod
+
+    def counting_chmod(fn, mode):
+        calls.append(fn)
+        return chmod(fn, mode)
+
+    monkeypatch.setattr(os, 'chmod', counting_chmod)
+    vz = vzlog.VzLog(str(path), file_rights='600')
+    N = 1000
+    for i in range(N):
+        with open(vz.impath('png'), 'wb') as f:
+            f.write(b'')
+    vz.flush()
+    # Each file is given its rights about once, not on every call
+    assert len(calls) < 2 * N
+    for fn in os.listdir(str(path)):
+        if fn.endswith('.png'):
+            assert os.stat(str(path / fn)).st_mode & 0o777 == 0o600
+    vz.close()
+
+
+@pytest.mark.parametrize('flush_entries', [None, 1])
+def test_pagination(path, flush_entries):
+    vz = vzlog.VzLog(str(path), page_entries=5, flush_entries=flush_entries)
+    for i in range(12):
+        vz.log(i)
+    vz.flush()
+    pages = [_read(path / 'page-{:04}.html'.format(no)) for no in (1, 2, 3)]
+    assert [page.count('<pre>') for page in pages] == [5, 5, 2]
+    for page in pages:
+        _assert_complete(page)
+    assert 'href="page-0002.html">next' in pages[0]
+    assert 'href="page-0001.html">previous' in pages[1]
+    assert 'next' not in pages[2]
+    index = _read(path / 'index.html')
+    assert index.count('<li>') == 3
+    vz.close()
+
+
+def test_tabs(path):
+    vz = vzlog.VzLog(str(path))
+    vz.tab('A')
+    vz.log('in a')
+    vz.tab('B')
+    vz.log('in b')
+    vz.tab('A')
+    vz.log('more in a')
+    vz.finalize_tabs()
+    vz.log('after')
+    vz.flush()
+    html = _read(path / 'index.html')
+    _assert_complete(html)
+    a = html.index('id="tabs-1"')
+    b = html.index('id="tabs-2"')
+    assert a < html.index('more in a') < b < html.index('in b')
+    assert html.index('in b') < html.index('after')
+    assert not [fn for fn in os.listdir(str(path)) if 'tab-' in fn]
+    vz.close()
+
+
+def test_tabs_across_pages_with_writer_thread(path):
+    vz = vzlog.VzLog(str(path), page_entries=5, threadsafe=True)
+    for i in range(23):
+        vz.log(i)
+    vz.tab('A')
+    vz.log('in a')
+    vz.tab('B')
+    vz.log('in b')
+    vz.finalize_tabs()
+    vz.flush()
+    html = _read(path / 'page-0005.html')
+    assert 'in a' in html and 'in b' in html
+    vz.close()
+
+
+def test_shards_are_merged(path):
+    logs = [vzlog.VzLog(str(path), shard=rank) for rank in range(2)]
+    for rank, vz in enumerate(logs):
+        vz.tab('t')
+        vz.log('text of shard', rank)
+        vz.finalize_tabs()
+        vz.image(np.zeros((4, 4)))
+    for vz in logs:
+        vz.close()
+    fns = sorted(os.listdir(str(path)))
+    assert fns == ['.vz', '0000-plot-0000.png', '0001-plot-0000.png',
+                   'shard-0000.html', 'shard-0001.html']
+
+    vzlog.merge_shards(str(path))
+    html = _read(path / 'index.html')
+    _assert_complete(html)
+    assert (html.index('text of shard 0') < html.index('0000-plot-0000') <
+            html.index('text of shard 1') < html.index('0001-plot-0000'))
+
+
+def test_embedded_images_are_deduplicated(path):
+    vz = vzlog.VzLog(str(path), embed_bytes=1000)
+    vz.image(np.zeros((4, 4)))
+    large = np.random.RandomState(0).uniform(size=(64, 64))
+    for i in range(3):
+        vz.image(large)
+    vz.flush()
+    html = _read(path / 'index.html')
+    assert html.count('data:image/png;base64,') == 1
+    fns = [fn for fn in os.listdir(str(path)) if fn.endswith('.png')]
+    assert len(fns) == 1
+    assert html.count('src="{}"'.format(fns[0])) == 3
+
+    # The files are deleted with the rest of the log
+    vz.clear()
+    vz.image(large)
+    vz.flush()
+    assert os.path.exists(str(path / fns[0]))
+    vz.close()
+
+
+def test_many_embedded_images_with_workers(path):
+    vz = vzlog.VzLog(str(path), embed_bytes=10**4, workers=2)
+    for i in range(700):
+        vz.image(np.zeros((4, 4)))
+        vz.log(i)
+    vz.flush()
+    html = _read(path / 'index.html')
+    assert html.count('data:image/png') == 700
+    assert html.count('<pre>') == 700
+    vz.close()
+
+
+def test_threads_keep_their_order(path):
+    vz = vzlog.VzLog(str(path), threadsafe=True)
+
+    def work(k):
+        for i in range(200):
+            vz.log('thread-{}-{:03}'.format(k, i))
+
+    threads = [threading.Thread(target=work, args=(k,)) for k in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    vz.flush()
+    html = _read(path / 'index.html')
+    assert html.count('<pre>') == 800
+    for k in range(4):
+        found = re.findall(r'thread-{}-(\d+)'.format(k), html)
+        assert found == ['{:03}'.format(i) for i in range(200)]
+    vz.close()
+
+
+@pytest.mark.parametrize('embed_bytes', [None, 10**7])
+def test_savefig_renders_before_returning(path, embed_bytes):
+    from matplotlib.figure import Figure
+    vz = vzlog.VzLog(str(path), workers=2, embed_bytes=embed_bytes)
+    fig = Figure()
+    ax = fig.add_subplot(1, 1, 1)
+    for i in range(5):
+        ax.clear()
+        ax.set_title('figure-{}'.format(i))
+        vz.savefig(fig)
+    vz.flush()
+    html = _read(path / 'index.html')
+    svgs = [base64.b64decode(s).decode('utf-8') for s in
+            re.findall(r'data:image/svg\+xml;base64,([^"]+)', html)]
+    svgs += [_read(path / fn) for fn in sorted(os.listdir(str(path)))
+             if fn.endswith('.svg')]
+    assert len(svgs) == 5
+    for i, svg in enumerate(svgs):
+        assert 'figure-{}'.format(i) in svg
+    vz.close()
+
+
+def test_image_formats(path):
+    from PIL import Image
+    vz = vzlog.VzLog(str(path))
+    fn = vz.image(np.zeros((4, 4)), ext='jpg')
+    vz.flush()
+    assert Image.open(fn).format == 'JPEG'
+    grid = vzlog.image.ImageGrid(np.zeros((2, 3, 3)))
+    for bad in ['plot', 'plot.nonexistent']:
+        with pytest.raises(ValueError):
+            grid.save(str(path / bad))
+    vz.close()
+
+
+def test_render_requires_keep_journal(path):
+    vz = vzlog.VzLog(str(path), flush_entries=1)
+    vz.log('text')
+    with pytest.raises(ValueError):
+        vz.render()
+    vz.close()
+
+    vz = vzlog.VzLog(str(path), flush_entries=1, keep_journal=True)
+    vz.log('text')
+    html = vz.render()
+    _assert_complete(html)
+    assert html.count('<pre>') == 1
+    vz.close()
@@ -1,9 +1,27 @@
 from __future__ import division, print_function, absolute_import
 
-from vzlog.vzlog import VzLog
-from vzlog import image
+import sys
 
-from vzlog.image import ImageGrid, ColorImageGrid
+from vzlog.vzlog import VzLog, merge_shards
+
+_LAZY_ATTRIBUTES = ('image', 'ImageGrid', 'ColorImageGrid',
+                    'TiledImageGrid')
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        # The image module pulls in NumPy, so it is loaded on first use to
+        # keep text-only logging fast to import.
+        if name in _LAZY_ATTRIBUTES:
+            import importlib
+            image = importlib.import_module('vzlog.image')
+            value = image if name == 'image' else getattr(image, name)
+            globals()[name] = value
+            return value
+        raise AttributeError('module {!r} has no attribute {!r}'.format(
+                             __name__, name))
+else:
+    from vzlog import image
+    from vzlog.image import ImageGrid, ColorImageGrid, TiledImageGrid
 
 VERSION = (0, 1, 9)
 ISRELEASE = False
@@ -11,4 +29,4 @@ __version__ = '{0}.{1}.{2}'.format(*VERSION)
 if not ISRELEASE:
     __version__ += '.git'
 
-__all__ = ['VzLog', 'image', '__version__']
+__all__ = ['VzLog', 'merge_shards', 'image', '__version__']
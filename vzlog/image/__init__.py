@@ -5,5 +5,8 @@ from __future__ import division, print_function, absolute_import
 
 from .image_grid import ImageGrid
 from .color_image_grid import ColorImageGrid
+from .tiled_image_grid import TiledImageGrid
+from .backend import get_backend, set_backend
 
-__all__ = ['ImageGrid', 'ColorImageGrid']
+__all__ = ['ImageGrid', 'ColorImageGrid', 'TiledImageGrid', 'get_backend',
+           'set_backend']
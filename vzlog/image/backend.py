@@ -0,0 +1,64 @@
+"""
+Selection of the implementation of the image kernels.
+
+The compiled Cython extension `vzlog.image.resample` is used if it is
+available, and otherwise the equivalent NumPy implementation in
+`vzlog.image.resample_numpy`. A backend can be forced with `set_backend`, or
+by setting the environment variable ``VZLOG_BACKEND`` to ``cython`` or
+``numpy`` before importing vzlog.
+"""
+from __future__ import division, print_function, absolute_import
+import os
+
+__all__ = ['get_backend', 'set_backend']
+
+_BACKENDS = ('cython', 'numpy')
+
+_name = None
+_kernels = None
+
+
+def set_backend(name=None):
+    """
+    Sets the backend of the image kernels.
+
+    Parameters
+    ----------
+    name : str or None
+        Either ``'cython'`` or ``'numpy'``. If None, the Cython extension is
+        used if it can be imported.
+
+    Raises
+    ------
+    ImportError
+        If ``'cython'`` is requested but the extension is not built.
+    """
+    global _name, _kernels
+    if name is None:
+        try:
+            return set_backend('cython')
+        except ImportError:
+            return set_backend('numpy')
+    elif name == 'cython':
+        from vzlog.image import resample as kernels
+    elif name == 'numpy':
+        from vzlog.image import resample_numpy as kernels
+    else:
+        raise ValueError('Unknown backend {!r}, expected one of {}'.format(
+                         name, ', '.join(_BACKENDS)))
+    _name = name
+    _kernels = kernels
+
+
+def get_backend():
+    """
+    Returns the name of the backend of the image kernels.
+    """
+    return _name
+
+
+def _get_kernels():
+    return _kernels
+
+
+set_backend(os.environ.get('VZLOG_BACKEND') or None)
@@ -1,10 +1,181 @@
 from __future__ import division, print_function, absolute_import
+import os
 import numpy as np
 
 
-# TODO: ImageGrid and ColorImageGrid need to be integrated more. Since both
-# represent the data as an RGB image, ColorImageGrid should be a suitable
-# base class.
+_CANVAS_DTYPES = (np.float64, np.float32, np.uint8)
+
+
+def _as_pixels(values, dtype):
+    """
+    Converts RGB values in [0, 1] to the canvas pixel format `dtype`. Values
+    that are already in that format are returned as is.
+    """
+    values = np.asarray(values)
+    if values.dtype == dtype:
+        return values
+    elif dtype == np.uint8:
+        return (values * 255).astype(np.uint8)
+    else:
+        return values.astype(dtype)
+
+
+def _upscale(data, scale):
+    """
+    Nearest-neighbor upscaling of an image of shape ``(height, width, 3)``.
+    Integer scales are done by broadcasting each pixel into a
+    ``scale x scale`` block, which produces the result with a single copy.
+    Other scales sample the pixel centers, like
+    ``skimage.transform.resize(..., order=0)``.
+    """
+    H, W = data.shape[:2]
+    if scale == int(scale):
+        s = int(scale)
+        big = np.broadcast_to(data[:, np.newaxis, :, np.newaxis],
+                              (H, s, W, s) + data.shape[2:])
+        return big.reshape((H * s, W * s) + data.shape[2:])
+    else:
+        out_h = int(round(H * scale))
+        out_w = int(round(W * scale))
+        ii = ((np.arange(out_h) + 0.5) * H / out_h).astype(np.intp)
+        jj = ((np.arange(out_w) + 0.5) * W / out_w).astype(np.intp)
+        return data[ii[:, np.newaxis], jj]
+
+
+# Encoder options favoring speed over size, keyed by PIL format name
+_FAST_SAVE_OPTIONS = {
+    'PNG': dict(compress_level=1),
+    'WEBP': dict(lossless=True, method=0),
+}
+
+
+def _save_pil(pil_im, fp, format=None, options=None):
+    """
+    Saves a PIL image to a path or file object. The format is an extension,
+    such as ``'jpg'``, or a PIL format name, and is taken from the extension
+    of the path if not given. Options of the encoder override the fast
+    defaults in `_FAST_SAVE_OPTIONS`.
+    """
+    from PIL import Image
+    if format is None:
+        if hasattr(fp, 'write'):
+            raise ValueError('The format is required to save to a file '
+                             'object')
+        ext = os.path.splitext(fp)[1]
+    else:
+        ext = '.' + format
+    formats = Image.registered_extensions()
+    if ext.lower() in formats:
+        format = formats[ext.lower()]
+    elif ext[1:].upper() in Image.SAVE:
+        format = ext[1:].upper()
+    elif format is None:
+        raise ValueError('Cannot tell the image format of {!r} from its '
+                         'extension'.format(fp))
+    else:
+        raise ValueError('Unknown image format {!r}'.format(format))
+    kwargs = dict(_FAST_SAVE_OPTIONS.get(format, {}))
+    if options:
+        kwargs.update(options)
+    pil_im.save(fp, format=format, **kwargs)
+
+
+def _read_only(a):
+    """
+    Returns a view of `a` that cannot be written through.
+    """
+    view = a.view()
+    view.flags.writeable = False
+    return view
+
+
+def _grid_layout(data, rows, cols, image_ndim=2):
+    """
+    Lays out a stack of images of grid data, where a single image has
+    `image_ndim` dimensions. Returns the images as an array of shape
+    ``(N, height, width, ...)`` along with the number of rows and columns of
+    the grid.
+    """
+    if data.ndim == image_ndim:
+        return data[np.newaxis], 1, 1
+
+    elif data.ndim == image_ndim + 1:
+        N = data.shape[0]
+        if rows is None and cols is None:
+            cols = int(np.ceil(np.sqrt(N)))
+            rows = int(np.ceil(N / cols))
+        elif rows is None:
+            rows = int(np.ceil(N / cols))
+        elif cols is None:
+            cols = int(np.ceil(N / rows))
+        return data, rows, cols
+
+    else:
+        assert rows is None and cols is None
+        return data.reshape((-1,) + data.shape[2:]), data.shape[0], \
+            data.shape[1]
+
+
+def _nanbounds(data, chunk_size=None):
+    """
+    Returns the smallest and largest value of `data`, ignoring NaNs. If
+    `chunk_size` is set, both are computed in a single pass that reads that
+    many images at a time.
+    """
+    if chunk_size is None:
+        return np.nanmin(data), np.nanmax(data)
+
+    vmin, vmax = np.inf, -np.inf
+    for i in range(0, len(data), chunk_size):
+        chunk = np.asarray(data[i:i + chunk_size])
+        if not np.isnan(chunk).all():
+            vmin = min(vmin, np.nanmin(chunk))
+            vmax = max(vmax, np.nanmax(chunk))
+    if vmin > vmax:
+        return np.nan, np.nan
+    return vmin, vmax
+
+
+def _normalized(images, vmin, vmax, vsym):
+    """
+    Scales a stack of images to [0, 1]. The bounds `vmin` and `vmax` can be
+    scalars, arrays with a value per image, or None to use the range of each
+    image. If `vsym` is True, the bounds of each image are made symmetric
+    around zero.
+    """
+    M = images.shape[0]
+    axes = tuple(range(1, images.ndim))
+    shape = (M,) + (1,) * len(axes)
+
+    # Per-image bounds, shaped to broadcast against the stack
+    if vmin is None:
+        vmin = np.nanmin(images, axis=axes)
+    if vmax is None:
+        vmax = np.nanmax(images, axis=axes)
+    vmin = np.broadcast_to(vmin, (M,)).reshape(shape)
+    vmax = np.broadcast_to(vmax, (M,)).reshape(shape)
+
+    if vsym:
+        mx = np.maximum(abs(vmin), abs(vmax))
+        sym = -vmin != vmax
+        vmin = np.where(sym, -mx, vmin)
+        vmax = np.where(sym, mx, vmax)
+
+    diff = np.where(vmin == vmax, 1, vmax - vmin)
+    return np.clip((images - vmin) / diff, 0, 1)
+
+
+def _border_width(border_width, rows, cols):
+    if border_width is None:
+        # Set to 1 if multiple images, or 0 if single image
+        if rows == 1 and cols == 1:
+            return 0
+        else:
+            return 1
+    else:
+        return border_width
+
+
 class ColorImageGrid(object):
     """
     An image grid used for combining equally-sized RGB images into a
@@ -38,8 +209,8 @@ class ColorImageGrid(object):
         rescaled with it. The default behavior (`border_width = None`) is that
         no width will be used when a single image is visualized, while a
         default width of 1 is used for multiple.
-    cmap/vmin/vmax/vsym :
-        See `ImageGrid.set_image`.
+    vmin/vmax/vsym :
+        See `ColorImageGrid.set_image`.
     global_bounds : bool
         If this is set to True and either `vmin` or `vmax` is not
         specified, it will infer it globally for the data. If `vsym` is
@@ -47,74 +218,75 @@ class ColorImageGrid(object):
         to False, it determines range per image, which would be the
         equivalent of calling `set_image` manually with `vmin`, `vmax` and
         `vsym` set the same.
+    dtype : np.float64, np.float32 or np.uint8
+        Pixel format of the canvas. See `ImageGrid`.
+    chunk_size/out/cache_scaled :
+        See `ImageGrid`.
+
+    This is also the base class of `ImageGrid`, which replaces
+    `_set_windows` with a kernel that colormaps intensities straight into
+    the canvas. Layout, border frames, scaling and encoding are shared.
     """
+    # Number of dimensions of a single image
+    _image_ndim = 3
+
     def __init__(self, data=None, rows=None, cols=None, shape=None,
                  border_color=1, border_width=None, vmin=0.0,
-                 vmax=1.0, vsym=False, global_bounds=True):
+                 vmax=1.0, vsym=False, global_bounds=True,
+                 dtype=np.float64, chunk_size=None, out=None,
+                 cache_scaled=False):
 
-        assert (data is None or
-                len(data) == 0 or
-                (np.ndim(data[0]) in (2, 3, 4) and data[0].shape[-1] <= 3))
+        ndim = self._image_ndim
+        assert data is None or np.ndim(data) in (ndim, ndim + 1, ndim + 2)
 
-        if data is not None:
+        if data is not None and (chunk_size is None or np.ndim(data) == ndim):
             data = np.asanyarray(data)
 
         if data is None:
             assert rows is not None and cols is not None, \
                 "Must specify rows and cols if no data is specified"
             shape = shape
-
-        elif data.ndim == 3:
-            N = 1
-            rows = 1
-            cols = 1
-            data = data[np.newaxis]
-            shape = data.shape[1:3]
-
-        elif data.ndim == 4:
-            N = data.shape[0]
-
-            if rows is None and cols is None:
-                cols = int(np.ceil(np.sqrt(N)))
-                rows = int(np.ceil(N / cols))
-            elif rows is None:
-                rows = int(np.ceil(N / cols))
-            elif cols is None:
-                cols = int(np.ceil(N / rows))
-            shape = data.shape[1:3]
-
-        elif data.ndim == 5:
-            assert rows is None and cols is None
-            rows = data.shape[0]
-            cols = data.shape[1]
-            data = data.reshape((-1,) + data.shape[2:])
+        else:
+            data, rows, cols = _grid_layout(data, rows, cols, ndim)
             N = data.shape[0]
             shape = data.shape[1:3]
 
+        if dtype not in _CANVAS_DTYPES:
+            raise ValueError('Unsupported canvas dtype: {}'.format(dtype))
+        self._dtype = np.dtype(dtype)
         self._border_color = self._prepare_color(border_color)
+        self._border_pixel = _as_pixels(self._border_color, self._dtype)
         self._rows = rows
         self._cols = cols
         self._shape = shape
-        if border_width is None:
-            # Set to 1 if multiple images, or 0 if single image
-            if rows == 1 and cols == 1:
-                self._border = 0
-            else:
-                self._border = 1
-        else:
-            self._border = border_width
+        self._border = _border_width(border_width, rows, cols)
 
         b = self._border
         self._fullsize = (b + (shape[0] + b) * self._rows,
                           b + (shape[1] + b) * self._cols)
 
-        self._data = np.ones(self._fullsize + (3,), dtype=np.float64)
-
-        if global_bounds:
+        canvas_shape = self._fullsize + (3,)
+        if out is None:
+            self._data = np.empty(canvas_shape, dtype=self._dtype)
+        elif isinstance(out, str):
+            self._data = np.lib.format.open_memmap(
+                out, mode='w+', dtype=self._dtype, shape=canvas_shape)
+        elif out.shape != canvas_shape or out.dtype != self._dtype:
+            raise ValueError('Canvas must have shape {} and dtype {}'.format(
+                             canvas_shape, self._dtype))
+        else:
+            self._data = out
+        self._data[:] = _as_pixels(1.0, self._dtype)
+        self._cache_scaled = cache_scaled
+        self._scaled_cache = None
+
+        if global_bounds and data is not None and (vmin is None or
+                                                   vmax is None):
+            bounds = _nanbounds(data, chunk_size)
             if vmin is None:
-                vmin = np.nanmin(data)
+                vmin = bounds[0]
             if vmax is None:
-                vmax = np.nanmax(data)
+                vmax = bounds[1]
 
             if vsym:
                 mx = max(abs(vmin), abs(vmax))
@@ -122,12 +294,29 @@ class ColorImageGrid(object):
                 vmax = mx
 
         # Populate with data
-        for i in range(min(N, rows * cols)):
-            self.set_image(data[i], i // cols, i % cols,
-                           vmin=vmin, vmax=vmax, vsym=vsym)
+        if data is not None:
+            n = min(N, rows * cols)
+            options = self._init_options()
+            if chunk_size is None:
+                self._set_images(data[:n], vmin=vmin, vmax=vmax, vsym=vsym,
+                                 **options)
+            else:
+                step = max(1, chunk_size // cols) * cols
+                for i in range(0, n, step):
+                    self._set_images(np.asarray(data[i:min(i + step, n)]),
+                                     row=i // cols, vmin=vmin, vmax=vmax,
+                                     vsym=vsym, **options)
 
         self._display_scale = 1
 
+    def _init_options(self):
+        """
+        Options of `_set_windows`, besides the bounds, used to populate the
+        grid with the data passed to the constructor. Subclasses that take
+        more options in their constructor return them here.
+        """
+        return {}
+
     @classmethod
     def _prepare_color(self, color):
         if color is None:
@@ -140,7 +329,8 @@ class ColorImageGrid(object):
     @property
     def image(self):
         """
-        Returns the image as a skimage.io.Image class.
+        Returns the image as an array of shape ``(height, width, 3)``, in
+        the pixel format of the canvas.
         """
         return self._data
 
@@ -167,56 +357,199 @@ class ColorImageGrid(object):
             specify neither `vmin` or `vmax` or only `vmax` together with this
             option.
         """
-        if vmin is None:
-            vmin = np.nanmin(image)
-        if vmax is None:
-            vmax = np.nanmax(image)
-
-        if vsym and -vmin != vmax:
-            mx = max(abs(vmin), abs(vmax))
-            vmin = -mx
-            vmax = mx
-
-        if vmin == vmax:
-            diff = 1
+        self._set_windows(np.asarray(image)[np.newaxis],
+                          row * self._cols + col, vmin=vmin, vmax=vmax,
+                          vsym=vsym)
+
+    def _colorize(self, images, vmin=0.0, vmax=1.0, vsym=False):
+        """
+        Converts a stack of images to RGB pixels in the canvas format, of
+        shape ``(M, height, width, 3)``, which `_set_windows` places in the
+        canvas.
+        """
+        C = images.shape[-1]
+        assert C <= 3
+        pixels = _as_pixels(_normalized(images, vmin, vmax, vsym),
+                            self._dtype)
+        if C == 1:
+            # Grayscale image
+            return np.broadcast_to(pixels, pixels.shape[:-1] + (3,))
+        elif C == 2:
+            # If two color channels, create a red-cyan image by repeating the
+            # second channel
+            return pixels[..., [0, 1, 1]]
         else:
-            diff = vmax - vmin
+            return pixels
 
-        img_scaled = np.clip((image - vmin) / diff, 0, 1)
+    def _set_images(self, images, row=0, **kwargs):
+        """
+        Sets ``len(images)`` windows in row-major order, starting at the
+        beginning of `row`. This is equivalent to calling `set_image` for
+        each image, but converts and places all of them with a single set of
+        array operations.
 
-        x0 = row * (self._shape[0] + self._border)
-        x1 = (row + 1) * (self._shape[0] + self._border) + self._border
-        y0 = col * (self._shape[1] + self._border)
-        y1 = (col + 1) * (self._shape[1] + self._border) + self._border
+        Parameters
+        ----------
+        images : ndarray
+            Stack of images, each with the shape of a grid window.
+        row : int
+            Row of the first window.
+        **kwargs
+            Options of `_set_windows`, such as `vmin`, `vmax` and `vsym`. If
+            `vmin` or `vmax` is None, it is determined per image.
+        """
+        self._set_windows(images, row * self._cols, **kwargs)
 
-        self._data[x0:x1, y0:y1] = self._border_color
+    def _set_windows(self, images, first, **kwargs):
+        """
+        Sets consecutive windows in row-major order, starting at the window
+        with index `first`. See `_set_images`.
+        """
+        if images.shape[0] == 0:
+            return
+        self._place(self._colorize(images, **kwargs), first)
 
-        anchor = (self._border + row * (self._shape[0] + self._border),
-                  self._border + col * (self._shape[1] + self._border))
+    def _paint_frames(self, first, count):
+        """
+        Paints the union of the border frames of `count` consecutive windows,
+        starting at the window with index `first`.
+        """
+        h, w = self._shape
+        b = self._border
+        cols = self._cols
+        row, col = divmod(first, cols)
+
+        # The rest of a row that is started in the middle
+        if col:
+            k = min(count, cols - col)
+            y0 = (h + b) * row
+            x0 = (w + b) * col
+            self._data[y0:y0 + h + 2 * b, x0:x0 + (w + b) * k + b] = \
+                self._border_pixel
+            count -= k
+            row += 1
+
+        full_rows, rest = divmod(count, cols)
+        if full_rows:
+            self._data[(h + b) * row:b + (h + b) * (row + full_rows)] = \
+                self._border_pixel
+        if rest:
+            r0 = (h + b) * (row + full_rows)
+            self._data[r0:r0 + h + 2 * b, :b + (w + b) * rest] = \
+                self._border_pixel
+
+    def _cells(self):
+        """
+        Returns a view of the canvas as ``(rows, h + b, cols, w + b, 3)``, so
+        that windows can be written with strided assignments.
+        """
+        h, w = self._shape
+        b = self._border
+        return self._data[b:b + (h + b) * self._rows,
+                          b:b + (w + b) * self._cols].reshape(
+                              (self._rows, h + b, self._cols, w + b, 3))
 
-        selection = [slice(anchor[0], anchor[0] + image.shape[0]),
-                     slice(anchor[1], anchor[1] + image.shape[1])]
+    def _place(self, rgb, first=0):
+        """
+        Writes a stack of RGB windows of shape ``(M, height, width, 3)`` in
+        the canvas format, along with their borders, to consecutive windows
+        starting at the window with index `first`.
+        """
+        M = rgb.shape[0]
+        h, w = self._shape
+        cols = self._cols
+        cells = self._cells()
+        self._paint_frames(first, M)
+
+        if rgb.shape[1:3] != (h, w):
+            # Images smaller than the windows are placed in their corner
+            ih, iw = rgb.shape[1:3]
+            for k in range(M):
+                row, col = divmod(first + k, cols)
+                cells[row, :ih, col, :iw] = rgb[k]
+            self._mark_windows(first, M)
+            return
+
+        row, col = divmod(first, cols)
+        n = 0
+        if col:
+            n = min(M, cols - col)
+            cells[row, :h, col:col + n, :w] = rgb[:n].transpose(1, 0, 2, 3)
+            row += 1
+
+        full_rows, rest = divmod(M - n, cols)
+        cells[row:row + full_rows, :h, :, :w] = (
+            rgb[n:n + full_rows * cols].reshape(full_rows, cols, h, w, 3)
+            .transpose(0, 2, 1, 3, 4))
+        n += full_rows * cols
+        if rest:
+            cells[row + full_rows, :h, :rest, :w] = \
+                rgb[n:].transpose(1, 0, 2, 3)
+
+        self._mark_windows(first, M)
+
+    def invalidate(self):
+        """
+        Drops the cached scaled canvas of a grid created with
+        `cache_scaled`. Call this after writing to `image`, or to the `out`
+        array, directly, since such writes are not tracked.
+        """
+        self._scaled_cache = None
 
-        C = image.shape[-1]
-        if C == 1:
-            # Grayscale image
-            self._data[selection] = img_scaled
-        elif C == 2:
-            # If two color channels, use only the first two and fill the third
-            # with the average of the two.
-            # Create a red-cyan 3D image representation from the two color
-            # channels
-            l = [img_scaled, img_scaled[..., [1]]]
-            nimage = np.concatenate(l, axis=-1)
-            self._data[selection] = nimage
-        elif C == 3:
-            self._data[selection] = img_scaled
+    def _mark_windows(self, first, count):
+        """
+        Marks consecutive windows as changed, so that the cached scaled
+        canvas is updated for them the next time it is used.
+        """
+        if self._scaled_cache is not None:
+            k = np.arange(first, first + count)
+            self._scaled_cache[2][k // self._cols, k % self._cols] = True
+
+    def _scaled_pixels(self, scale, dtype):
+        """
+        Returns the canvas upscaled by `scale` in the pixel format `dtype`.
+
+        If the grid was created with `cache_scaled`, the result is cached
+        for integer scales, and later calls only recompute the windows that
+        changed since, so that repeatedly saving a grid where a few windows
+        change costs in proportion to those windows. The cache holds the
+        last requested scale and format, and is returned as a read-only
+        view.
+        """
+        if scale == 1 and dtype == self._dtype:
+            return self._data
+        if not self._cache_scaled or scale != int(scale):
+            return _upscale(_as_pixels(self._data, dtype), scale)
+
+        s = int(scale)
+        key = (s, np.dtype(dtype))
+        if self._scaled_cache is None or self._scaled_cache[0] != key:
+            canvas = np.array(_upscale(_as_pixels(self._data, dtype), s))
+            dirty = np.zeros((self._rows, self._cols), dtype=bool)
+            self._scaled_cache = [key, canvas, dirty]
+            return _read_only(canvas)
+
+        key, canvas, dirty = self._scaled_cache
+        if dirty.mean() > 0.5:
+            canvas[:] = _upscale(_as_pixels(self._data, dtype), s)
+        else:
+            h, w = self._shape
+            b = self._border
+            for row, col in zip(*np.nonzero(dirty)):
+                x0 = row * (h + b)
+                x1 = x0 + h + 2 * b
+                y0 = col * (w + b)
+                y1 = y0 + w + 2 * b
+                canvas[x0 * s:x1 * s, y0 * s:y1 * s] = _upscale(
+                    _as_pixels(self._data[x0:x1, y0:y1], dtype), s)
+        dirty[:] = False
+        return _read_only(canvas)
 
     def highlight(self, col=None, row=None, color=None):
         # TODO: This function is not done yet and needs more work
 
         bw = self._border
-        M = np.ones(tuple(np.add(self._shape, 2 * bw)) + (1,), dtype=np.bool)
+        M = np.ones(tuple(np.add(self._shape, 2 * bw)) + (1,), dtype=bool)
         M[bw:-bw, bw:-bw] = 0
 
         def setup_axis(axis, count):
@@ -231,14 +564,16 @@ class ColorImageGrid(object):
         cols = [col] * self._rows
         rows = list(range(self._rows))
 
-        color = self._prepare_color(color)
+        color = _as_pixels(self._prepare_color(color), self._dtype)
         for c, r in zip(cols, rows):
             r0 = (self._border + self._shape[0]) * r
             c0 = (self._border + self._shape[1]) * c
 
-            sel = [slice(r0, r0+M.shape[0]), slice(c0, c0+M.shape[1])]
+            sel = (slice(r0, r0+M.shape[0]), slice(c0, c0+M.shape[1]))
 
-            self._data[sel] = M * color + ~M * self._data[sel]
+            self._data[sel] = np.where(M, color, self._data[sel])
+
+        self._scaled_cache = None
 
     def scaled_image(self, scale=1):
         """
@@ -252,55 +587,74 @@ class ColorImageGrid(object):
 
         Returns
         -------
-        scaled_image : skimage.io.Image, (height, width, 3)
-            Returns a scaled up RGB image. If you do not have scikit-image, it
-            will be returned as a regular Numpy array. The benefit of wrapping
-            it in `Image`, is so that it will be automatically displayed in
-            IPython notebook, without having to issue any drawing calls.
+        scaled_image : ndarray, (height, width, 3)
+            Returns a scaled up RGB image, in the pixel format of the canvas.
+            With `cache_scaled`, it is a read-only view of the grid's cache,
+            which is updated in place when windows change, so copy it if you
+            need to keep it.
         """
-        if scale == 1:
-            return self._data
-        else:
-            from skimage.transform import resize
-            data = resize(self._data, tuple([self._data.shape[i] * scale
-                                             for i in range(2)]), order=0)
-            return data
+        return self._scaled_pixels(scale, self._dtype)
 
     def pil_image(self, scale=1):
         from PIL import Image
-        data = self.scaled_image(scale)
-        pil_im = Image.fromarray((data*255).astype(np.uint8))
+        pil_im = Image.fromarray(self._scaled_pixels(scale, np.uint8))
         return pil_im
 
-    def save(self, path, scale=1):
+    def save(self, path, scale=1, format=None, **options):
         """
-        Save the image to file.
+        Save the image to file. The encoder favors speed over size by
+        default, e.g. PNG files use compression level 1.
 
         Parameters
         ----------
-        path : str
+        path : str or file object
             Output path.
         scale : int
             Upscaling using nearest neighbor, e.g. a scale of 5 will make each
             pixel a 5x5 rectangle in the output.
+        format : str
+            Image format, as an extension such as ``'png'``, ``'webp'`` or
+            ``'jpg'``, or a PIL format name. By default it is determined by
+            the extension of `path`.
+        **options
+            Options of the PIL encoder, e.g. ``compress_level`` (0-9) and
+            ``compress_type`` (zlib strategy, 3 for run-length encoding) for
+            PNG, ``lossless`` and ``method`` for WebP, or ``quality`` for
+            JPEG.
         """
-        self.pil_image(scale=scale).save(path)
+        _save_pil(self.pil_image(scale=scale), path, format, options)
 
     def scaled(self, scale=1):
+        """
+        Change the display size of the grid. This is useful in for instance
+        an IPython notebook session.
+
+        Parameters
+        ----------
+        scale : integer
+            Scale factor.
+
+        Returns
+        -------
+        self : ColorImageGrid
+            Returns self
+        """
         self._display_scale = scale
         return self
 
+    def _vzlog_output_(self, vz):
+        vz.image(self, scale=self._display_scale)
+
     def _repr_png_(self):
-        from PIL import Image
         from io import BytesIO
-        data = self.scaled_image(self._display_scale)
-        pil_im = Image.fromarray((data*255).astype(np.uint8))
+        pil_im = self.pil_image(self._display_scale)
         b = BytesIO()
-        pil_im.save(b, format='png')
+        _save_pil(pil_im, b, 'png')
         return b.getvalue()
 
     def __repr__(self):
-        return ('ColorImageGrid(rows={rows}, cols={cols}, shape={shape})'.
-                format(rows=self._rows,
-                       cols=self._cols,
-                       shape=self._shape))
+        return '{name}(rows={rows}, cols={cols}, shape={shape})'.format(
+               name=type(self).__name__,
+               rows=self._rows,
+               cols=self._cols,
+               shape=self._shape)
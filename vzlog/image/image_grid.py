@@ -1,8 +1,111 @@
 from __future__ import division, print_function, absolute_import
+import threading
+from collections import OrderedDict
 import numpy as np
+from . import backend, resample_numpy
+from .color_image_grid import (ColorImageGrid, _CANVAS_DTYPES, _as_pixels,
+                               _normalized)
 
+# Lookup tables of the most recently used colormaps, shared by all grids.
+# Each entry maps a colormap key and a number of levels to the colormap and
+# its table in every canvas pixel format.
+_LUT_CACHE_SIZE = 32
+_lut_cache = OrderedDict()
+_lut_cache_lock = threading.Lock()
 
-class ImageGrid(object):
+
+def _default_cmap(vsym):
+    from matplotlib import cm
+    if vsym:
+        # Pick a default that is white exactly at 0
+        return cm.RdBu_r
+    else:
+        return cm.gray
+
+
+def _cmap_key(cmap):
+    """
+    Cache key of a colormap. Matplotlib colormaps are not hashable and are
+    often copied, so they are identified by name and resolution, and other
+    callables by identity.
+    """
+    from matplotlib.colors import Colormap
+    if isinstance(cmap, Colormap):
+        return (cmap.name, cmap.N)
+    else:
+        return id(cmap)
+
+
+def _resampled(cmap, levels):
+    """
+    Returns `cmap` with `levels` entries, if that is more than both its own
+    number of entries and the default 256. Matplotlib colormaps quantize
+    their input to their own number of entries, so sampling one more finely
+    than that only repeats colors. Listed colormaps with fewer than 256
+    colors are qualitative and are kept as is.
+    """
+    from matplotlib.colors import (Colormap, LinearSegmentedColormap,
+                                   ListedColormap)
+    if not isinstance(cmap, Colormap) or levels <= max(cmap.N, 256):
+        return cmap
+    elif isinstance(cmap, ListedColormap):
+        if cmap.N < 256:
+            return cmap
+        # Resampling a listed colormap only repeats its colors, so
+        # interpolate between them instead
+        return LinearSegmentedColormap.from_list(cmap.name, cmap.colors,
+                                                 N=levels)
+    elif hasattr(cmap, 'resampled'):
+        return cmap.resampled(levels)
+    else:
+        # Matplotlib older than 3.5
+        return cmap._resample(levels)
+
+
+def _colormap_lut(cmap, levels=256, dtype=np.float64):
+    """
+    Returns a read-only lookup table of shape ``(levels, 3)`` in the canvas
+    pixel format `dtype`, by sampling `cmap` resampled to `levels` entries
+    uniformly in [0, 1]. The tables are built once per colormap and number
+    of levels, in every pixel format, and kept in a process-wide cache of
+    the most recently used ones.
+    """
+    key = (_cmap_key(cmap), levels)
+    with _lut_cache_lock:
+        entry = _lut_cache.pop(key, None)
+        # Colormaps with the same name can still differ
+        if entry is not None and (entry[0] is cmap or entry[0] == cmap):
+            _lut_cache[key] = entry
+            return entry[1][np.dtype(dtype)]
+
+    x = np.linspace(0, 1, levels)
+    rgb = np.array(_resampled(cmap, levels)(x), dtype=np.float64)
+    rgb = np.clip(rgb[:, :3], 0, 1)
+    luts = {}
+    for pixel_dtype in _CANVAS_DTYPES:
+        lut = np.array(_as_pixels(rgb, pixel_dtype))
+        lut.flags.writeable = False
+        luts[np.dtype(pixel_dtype)] = lut
+
+    with _lut_cache_lock:
+        _lut_cache[key] = (cmap, luts)
+        while len(_lut_cache) > _LUT_CACHE_SIZE:
+            _lut_cache.popitem(last=False)
+    return luts[np.dtype(dtype)]
+
+
+def _lut_indices(images, levels, vmin, vmax, vsym):
+    """
+    Scales a stack of images to indices into a lookup table of `levels`
+    entries, as `np.uint8`, or `np.uint16` for more than 256 levels.
+    """
+    indices = _normalized(images, vmin, vmax, vsym) * (levels - 1)
+    # NaNs get an arbitrary index, since their pixels are masked
+    with np.errstate(invalid='ignore'):
+        return indices.astype(np.uint8 if levels <= 256 else np.uint16)
+
+
+class ImageGrid(ColorImageGrid):
     """
     An image grid used for combining equally-sized intensity images into a
     single larger image.
@@ -34,7 +137,7 @@ class ImageGrid(object):
         rescaled with it. The default behavior (`border_width = None`) is that
         no width will be used when a single image is visualized, while a
         default width of 1 is used for multiple.
-    cmap/vmin/vmax/vsym :
+    cmap/vmin/vmax/vsym/levels :
         See `ImageGrid.set_image`.
     global_bounds : bool
         If this is set to True and either `vmin` or `vmax` is not
@@ -43,6 +146,26 @@ class ImageGrid(object):
         to False, it determines range per image, which would be the
         equivalent of calling `set_image` manually with `vmin`, `vmax` and
         `vsym` set the same.
+    dtype : np.float64, np.float32 or np.uint8
+        Pixel format of the canvas. Float canvases hold values in [0, 1].
+        With `np.uint8`, the canvas is written directly in its final 8-bit
+        format, which uses an eighth of the memory and needs no conversion
+        when saved.
+    chunk_size : int or None
+        If set, the data is read and colormapped this many images at a time
+        (rounded to whole rows of the grid), including when inferring global
+        bounds. The data is then not converted to an array up front, so a
+        memory-mapped array or an array-like such as an HDF5 dataset is never
+        loaded all at once.
+    out : str, ndarray or None
+        Canvas to write to instead of allocating one. It can be an array of
+        shape ``(height, width, 3)`` and type `dtype`, or a path where a
+        ``.npy`` memory-mapped array of that shape is created.
+    cache_scaled : bool
+        Keep the upscaled canvas used by `scaled_image`, `pil_image` and
+        `save` between calls, and only update the windows set since. Writes
+        to `image` or to `out` that bypass `set_image` are not tracked, so
+        call `invalidate` after them.
 
     Examples
     --------
@@ -69,102 +192,27 @@ class ImageGrid(object):
     If you are working in an IPython notebook, you can display
     ``img`` simply by adding it to the end of a cell.
     """
+    _image_ndim = 2
+
     def __init__(self, data=None, rows=None, cols=None, shape=None,
                  border_color=1, border_width=None, cmap=None, vmin=None,
-                 vmax=None, vsym=False, global_bounds=True):
-
-        assert data is None or np.ndim(data) in (2, 3, 4)
-
-        if data is not None:
-            data = np.asanyarray(data)
-
-        if data is None:
-            assert rows is not None and cols is not None, \
-                "Must specify rows and cols if no data is specified"
-            shape = shape
-
-        elif data.ndim == 2:
-            N = 1
-            rows = 1
-            cols = 1
-            data = data[np.newaxis]
-            shape = data.shape[1:3]
-
-        elif data.ndim == 3:
-            N = data.shape[0]
-
-            if rows is None and cols is None:
-                cols = int(np.ceil(np.sqrt(N)))
-                rows = int(np.ceil(N / cols))
-            elif rows is None:
-                rows = int(np.ceil(N / cols))
-            elif cols is None:
-                cols = int(np.ceil(N / rows))
-            shape = data.shape[1:3]
-
-        elif data.ndim == 4:
-            assert rows is None and cols is None
-            rows = data.shape[0]
-            cols = data.shape[1]
-            data = data.reshape((-1,) + data.shape[2:])
-            N = data.shape[0]
-            shape = data.shape[1:3]
-
-        self._border_color = self._prepare_color(border_color)
-        self._rows = rows
-        self._cols = cols
-        self._shape = shape
-        if border_width is None:
-            # Set to 1 if multiple images, or 0 if single image
-            if rows == 1 and cols == 1:
-                self._border = 0
-            else:
-                self._border = 1
-        else:
-            self._border = border_width
-
-        b = self._border
-        self._fullsize = (b + (shape[0] + b) * self._rows,
-                          b + (shape[1] + b) * self._cols)
-
-        self._data = np.ones(self._fullsize + (3,), dtype=np.float64)
-
-        if global_bounds:
-            if vmin is None:
-                vmin = np.nanmin(data)
-            if vmax is None:
-                vmax = np.nanmax(data)
-
-            if vsym:
-                mx = max(abs(vmin), abs(vmax))
-                vmin = -mx
-                vmax = mx
-
-        # Populate with data
-        for i in range(min(N, rows * cols)):
-            self.set_image(data[i], i // cols, i % cols,
-                           cmap=cmap, vmin=vmin, vmax=vmax, vsym=vsym)
-
-        self._display_scale = 1
-
-    @classmethod
-    def _prepare_color(self, color):
-        if color is None:
-            return np.array([1.0, 1.0, 1.0])
-        elif isinstance(color, (int, float)):
-            return np.array([color]*3)
-        else:
-            return np.array(color)
-
-    @property
-    def image(self):
-        """
-        Returns the image as a skimage.io.Image class.
-        """
-        return self._data
+                 vmax=None, vsym=False, global_bounds=True,
+                 dtype=np.float64, chunk_size=None, out=None, levels=256,
+                 cache_scaled=False):
+        # Used by _init_options when the base constructor sets the data
+        self._cmap = cmap
+        self._levels = levels
+        super(ImageGrid, self).__init__(
+            data, rows=rows, cols=cols, shape=shape,
+            border_color=border_color, border_width=border_width, vmin=vmin,
+            vmax=vmax, vsym=vsym, global_bounds=global_bounds, dtype=dtype,
+            chunk_size=chunk_size, out=out, cache_scaled=cache_scaled)
+
+    def _init_options(self):
+        return dict(cmap=self._cmap, levels=self._levels)
 
     def set_image(self, image, row, col, cmap=None, vmin=None, vmax=None,
-                  vsym=False):
+                  vsym=False, levels=256):
         """
         Sets the data for a single window.
 
@@ -186,163 +234,38 @@ class ImageGrid(object):
             will override that and extend the shorter one. Good practice is to
             specify neither `vmin` or `vmax` or only `vmax` together with this
             option.
+        levels : int
+            Number of levels of the lookup table the colormap is sampled
+            into. Use more than 256, up to 65536, to keep fine intensity
+            differences of high-dynamic-range data apart.
         """
-        from matplotlib import colors
-        from matplotlib.pylab import cm
-        from vzlog.image.resample import resample_and_arrange_image
-
-        if cmap is None:
-            if vsym:
-                # Pick a default that is white exactly at 0
-                cmap = cm.RdBu_r
-            else:
-                cmap = cm.gray
-        if vmin is None:
-            vmin = np.nanmin(image)
-        if vmax is None:
-            vmax = np.nanmax(image)
-
-        if vsym and -vmin != vmax:
-            mx = max(abs(vmin), abs(vmax))
-            vmin = -mx
-            vmax = mx
-
-        if vmin == vmax:
-            diff = 1
-        else:
-            diff = vmax - vmin
-
-        image_indices = np.clip((image - vmin) / diff, 0, 1) * 255
-        image_indices = image_indices.astype(np.uint8)
-
-        nan_mask = np.isnan(image).astype(np.uint8)
-
-        lut = colors.makeMappingArray(256, cmap)
-        rgb = resample_and_arrange_image(image_indices, nan_mask, self._shape,
-                                         lut)
-
-        x0 = row * (self._shape[0] + self._border)
-        x1 = (row + 1) * (self._shape[0] + self._border) + self._border
-        y0 = col * (self._shape[1] + self._border)
-        y1 = (col + 1) * (self._shape[1] + self._border) + self._border
-
-        self._data[x0:x1, y0:y1] = self._border_color
-
-        anchor = (self._border + row * (self._shape[0] + self._border),
-                  self._border + col * (self._shape[1] + self._border))
-
-        selection = (slice(anchor[0], anchor[0] + rgb.shape[0]),
-                     slice(anchor[1], anchor[1] + rgb.shape[1]))
-
-        nan_data = np.isnan(rgb)
-        rgb[nan_data] = 0.0
-
-        self._data[selection] = (rgb * ~nan_data +
-                                 self._border_color * nan_data)
-
-    def highlight(self, col=None, row=None, color=None):
-        # TODO: This function is not done yet and needs more work
-
-        bw = self._border
-        M = np.ones(tuple(np.add(self._shape, 2 * bw)) + (1,), dtype=np.bool)
-        M[bw:-bw, bw:-bw] = 0
-
-        def setup_axis(axis, count):
-            if axis is None:
-                return list(range(count))
-            elif isinstance(axis, int):
-                return [axis]
-            else:
-                return axis
-
-        # TODO: This is temporary
-        cols = [col] * self._rows
-        rows = list(range(self._rows))
-
-        color = self._prepare_color(color)
-        for c, r in zip(cols, rows):
-            r0 = (self._border + self._shape[0]) * r
-            c0 = (self._border + self._shape[1]) * c
-
-            sel = (slice(r0, r0+M.shape[0]), slice(c0, c0+M.shape[1]))
-
-            self._data[sel] = M * color + ~M * self._data[sel]
-
-    def scaled_image(self, scale=1):
-        """
-        Returns a nearest-neighbor upscaled scaled version of the image.
+        self._set_windows(np.asarray(image)[np.newaxis],
+                          row * self._cols + col, cmap=cmap, vmin=vmin,
+                          vmax=vmax, vsym=vsym, levels=levels)
 
-        Parameters
-        ----------
-        scale : int
-            Upscaling using nearest neighbor, e.g. a scale of 5 will make each
-            pixel a 5x5 rectangle in the output.
-
-        Returns
-        -------
-        scaled_image : skimage.io.Image, (height, width, 3)
-            Returns a scaled up RGB image. If you do not have scikit-image, it
-            will be returned as a regular Numpy array. The benefit of wrapping
-            it in `Image`, is so that it will be automatically displayed in
-            IPython notebook, without having to issue any drawing calls.
+    def _set_windows(self, images, first, cmap=None, vmin=None, vmax=None,
+                     vsym=False, levels=256):
         """
-        if scale == 1:
-            return self._data
-        else:
-            from skimage.transform import resize
-            data = resize(self._data, tuple([self._data.shape[i] * scale
-                                             for i in range(2)]), order=0)
-            return data
-
-    def pil_image(self, scale=1):
-        from PIL import Image
-        data = self.scaled_image(scale)
-        pil_im = Image.fromarray((data*255).astype(np.uint8))
-        return pil_im
-
-    def save(self, path, scale=1):
+        Colormaps consecutive windows, starting at the window with index
+        `first`, with a kernel that writes the whole stack straight into the
+        canvas. The kernel comes from the backend in `vzlog.image.backend`.
         """
-        Save the image to file.
+        if images.shape[0] == 0:
+            return
 
-        Parameters
-        ----------
-        path : str
-            Output path.
-        scale : int
-            Upscaling using nearest neighbor, e.g. a scale of 5 will make each
-            pixel a 5x5 rectangle in the output.
-        """
-        self.pil_image(scale=scale).save(path)
+        kernels = backend._get_kernels()
+        if not self._data.flags.c_contiguous:
+            # Only the NumPy kernel writes to strided canvases
+            kernels = resample_numpy
 
-    def scaled(self, scale=1):
-        """
-        Change the display size of the grid. This is useful in for instance
-        an IPython notebook session.
+        if cmap is None:
+            cmap = _default_cmap(vsym)
 
-        Parameters
-        ----------
-        scale : integer
-            Scale factor.
+        indices = _lut_indices(images, levels, vmin, vmax, vsym)
+        lut = _colormap_lut(cmap, levels, self._dtype)
 
-        Returns
-        -------
-        self : ImageGrid
-            Returns self
-        """
-        self._display_scale = scale
-        return self
-
-    def _repr_png_(self):
-        from PIL import Image
-        from io import BytesIO
-        data = self.scaled_image(self._display_scale)
-        pil_im = Image.fromarray((data*255).astype(np.uint8))
-        b = BytesIO()
-        pil_im.save(b, format='png')
-        return b.getvalue()
-
-    def __repr__(self):
-        return 'ImageGrid(rows={rows}, cols={cols}, shape={shape})'.format(
-               rows=self._rows,
-               cols=self._cols,
-               shape=self._shape)
+        self._paint_frames(first, images.shape[0])
+        kernels.colormap_windows(indices, np.isnan(images), lut,
+                                 self._border_pixel, self._data, self._shape,
+                                 self._border, self._cols, first)
+        self._mark_windows(first, images.shape[0])
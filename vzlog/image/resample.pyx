@@ -3,40 +3,235 @@
 # cython: wraparound=False
 # cython: embedsignature=True
 # cython: cdivision=True
-
+"""
+Compiled image kernels. `colormap_windows` is used by `ImageGrid` to write
+stacks of windows into its canvas. `resample_and_arrange_image` colormaps
+and resamples a single image, and is kept as public API for callers that
+want that without a grid. Both have NumPy equivalents in
+`vzlog.image.resample_numpy`.
+"""
 import numpy as np
 cimport numpy as np
+from cython.parallel cimport prange
+
+ctypedef fused pixel_t:
+    np.float64_t
+    np.float32_t
+    np.uint8_t
+
+# Lookup table indices, 16-bit for tables of more than 256 levels
+ctypedef fused index_t:
+    np.uint8_t
+    np.uint16_t
+
+# Output sizes (in pixels) from which rows are processed in parallel. Below
+# it, starting the threads costs more than it saves.
+cdef enum:
+    PARALLEL_PIXELS = 65536
 
 
-def resample_and_arrange_image(np.ndarray[dtype=np.uint8_t, ndim=2] image,
-                               np.ndarray[dtype=np.uint8_t, ndim=2] nan_mask,
-                               target_size,
-                               np.ndarray[dtype=np.float64_t, ndim=2] lut):
+cdef inline void _resample_row(const np.uint8_t[:, :] image,
+                               const np.uint8_t[:, :] nan_mask,
+                               const pixel_t[:, ::1] lut,
+                               const pixel_t[::1] nan_color,
+                               pixel_t[:, :, ::1] output,
+                               const Py_ssize_t[::1] cols,
+                               Py_ssize_t i, Py_ssize_t si) noexcept nogil:
     cdef:
-        int dim0 = image.shape[0]
-        int dim1 = image.shape[1]
-        int output_dim0 = target_size[0]
-        int output_dim1 = target_size[1]
-        np.ndarray[np.float64_t, ndim=3] output = np.empty(target_size + (3,),
-                                                          dtype=np.float64)
-        np.uint8_t[:, :] image_mv = image
-        np.float64_t[:, :, :] output_mv = output
-        np.float64_t[:, :] lut_mv = lut
-        np.uint8_t[:, :] nan_mask_mv = nan_mask
-        double mn = image.min()
-        int i, j, c
+        Py_ssize_t j, sj
+        const pixel_t *src
         np.uint8_t v
-        np.float64_t NaN = np.nan
 
-    with nogil:
-        for i in range(output_dim0):
-            for j in range(output_dim1):
-                if nan_mask_mv[i, j]:
-                    for c in range(3):
-                        output_mv[i, j, c] = NaN
-                else:
-                    for c in range(3):
-                        v = image[dim0*i/output_dim0, dim1*j/output_dim1]
-                        output_mv[i, j, c] = lut_mv[v, c]
+    for j in range(output.shape[1]):
+        sj = cols[j]
+        if nan_mask[si, sj]:
+            src = &nan_color[0]
+        else:
+            v = image[si, sj]
+            src = &lut[v, 0]
+        output[i, j, 0] = src[0]
+        output[i, j, 1] = src[1]
+        output[i, j, 2] = src[2]
+
+
+cdef void _resample(const np.uint8_t[:, :] image,
+                    const np.uint8_t[:, :] nan_mask,
+                    const pixel_t[:, ::1] lut,
+                    const pixel_t[::1] nan_color,
+                    pixel_t[:, :, ::1] output,
+                    const Py_ssize_t[::1] rows,
+                    const Py_ssize_t[::1] cols) noexcept nogil:
+    cdef Py_ssize_t i
+
+    if output.shape[0] * output.shape[1] >= PARALLEL_PIXELS:
+        for i in prange(output.shape[0], schedule='static'):
+            _resample_row(image, nan_mask, lut, nan_color, output, cols,
+                          i, rows[i])
+    else:
+        for i in range(output.shape[0]):
+            _resample_row(image, nan_mask, lut, nan_color, output, cols,
+                          i, rows[i])
+
+
+def resample_and_arrange_image(image, nan_mask, target_size, lut,
+                               nan_color=None):
+    """
+    Resamples an image of lookup table indices to `target_size` using
+    nearest neighbor and maps it to RGB through `lut`. Large images are
+    processed with a thread per block of rows, if the extension was built
+    with OpenMP.
+
+    :param image: Array of type `np.uint8` with indices into `lut`.
+    :param nan_mask: Array of type `np.uint8` of the same shape, which is
+                     nonzero for pixels that should get `nan_color`.
+    :param target_size: Output height and width.
+    :param lut: Lookup table of shape ``(N, 3)`` or more columns, of which
+                the first three are used. The output has the same type,
+                which is `np.float64` or `np.uint8`.
+    :param nan_color: Color of masked pixels. It defaults to NaN, so it is
+                      required for `np.uint8` output.
+    :returns: Array of shape ``target_size + (3,)``.
+    """
+    cdef:
+        np.uint8_t[:, :, ::1] output_u8
+        np.float64_t[:, :, ::1] output_f64
+
+    lut = np.asarray(lut)
+    dtype = np.uint8 if lut.dtype == np.uint8 else np.float64
+    lut = np.ascontiguousarray(lut[:, :3], dtype=dtype)
+    if nan_color is None:
+        if dtype == np.uint8:
+            raise ValueError('nan_color is required for np.uint8 output')
+        nan_color = np.nan
+    nan_color = np.ascontiguousarray(np.broadcast_to(nan_color, (3,)),
+                                     dtype=dtype)
+
+    target_size = (int(target_size[0]), int(target_size[1]))
+    output = np.empty(target_size + (3,), dtype=dtype)
+
+    # Source row and column of each output row and column
+    rows = np.arange(target_size[0], dtype=np.intp) * image.shape[0] \
+        // target_size[0]
+    cols = np.arange(target_size[1], dtype=np.intp) * image.shape[1] \
+        // target_size[1]
 
+    if dtype == np.uint8:
+        output_u8 = output
+        _resample[np.uint8_t](image, nan_mask, lut, nan_color, output_u8,
+                              rows, cols)
+    else:
+        output_f64 = output
+        _resample[np.float64_t](image, nan_mask, lut, nan_color, output_f64,
+                                rows, cols)
     return output
+
+
+cdef inline void _colormap_window(const index_t[:, :, :] indices,
+                                  const np.uint8_t[:, :, :] nan_mask,
+                                  const pixel_t[:, ::1] lut,
+                                  const pixel_t[::1] nan_color,
+                                  pixel_t[:, :, ::1] canvas,
+                                  const Py_ssize_t[::1] rows,
+                                  const Py_ssize_t[::1] cols,
+                                  Py_ssize_t n, Py_ssize_t y0,
+                                  Py_ssize_t x0) noexcept nogil:
+    cdef:
+        Py_ssize_t i, j, si, sj
+        const pixel_t *src
+        pixel_t *dst
+
+    for i in range(rows.shape[0]):
+        si = rows[i]
+        for j in range(cols.shape[0]):
+            sj = cols[j]
+            if nan_mask[n, si, sj]:
+                src = &nan_color[0]
+            else:
+                src = &lut[indices[n, si, sj], 0]
+            dst = &canvas[y0 + i, x0 + j, 0]
+            dst[0] = src[0]
+            dst[1] = src[1]
+            dst[2] = src[2]
+
+
+def _colormap_windows(const index_t[:, :, :] indices,
+                      const np.uint8_t[:, :, :] nan_mask,
+                      const pixel_t[:, ::1] lut,
+                      const pixel_t[::1] nan_color,
+                      pixel_t[:, :, ::1] canvas,
+                      const Py_ssize_t[::1] rows,
+                      const Py_ssize_t[::1] cols,
+                      Py_ssize_t border, Py_ssize_t grid_cols,
+                      Py_ssize_t first):
+    # Specialized when called for the types of the indices and the canvas
+    cdef:
+        Py_ssize_t n, k
+        Py_ssize_t h = rows.shape[0]
+        Py_ssize_t w = cols.shape[0]
+        Py_ssize_t N = indices.shape[0]
+
+    with nogil:
+        # Windows do not overlap, so each can be written by its own thread
+        if N * h * w >= PARALLEL_PIXELS:
+            for n in prange(N, schedule='static'):
+                k = first + n
+                _colormap_window(indices, nan_mask, lut, nan_color, canvas,
+                                 rows, cols, n,
+                                 border + (k // grid_cols) * (h + border),
+                                 border + (k % grid_cols) * (w + border))
+        else:
+            for n in range(N):
+                k = first + n
+                _colormap_window(indices, nan_mask, lut, nan_color, canvas,
+                                 rows, cols, n,
+                                 border + (k // grid_cols) * (h + border),
+                                 border + (k % grid_cols) * (w + border))
+
+
+def colormap_windows(indices, nan_mask, lut, nan_color, canvas, shape,
+                     border, grid_cols, first=0):
+    """
+    Colormaps a stack of images of lookup table indices and writes them
+    straight into consecutive windows of an image grid canvas, in row-major
+    order starting at the window with index `first`. The images are
+    resampled to the window `shape` with nearest neighbor if they differ.
+    Borders are not painted. Large stacks are processed with a thread per
+    block of windows, if the extension was built with OpenMP.
+
+    :param indices: Array of type `np.uint8`, or `np.uint16` for tables of
+                    more than 256 levels, and shape ``(N, h, w)`` with
+                    indices into `lut`.
+    :param nan_mask: Array of the same shape, of type `np.uint8` or `bool`,
+                     which is nonzero for pixels that should get `nan_color`.
+    :param lut: Lookup table of shape ``(L, 3)`` or more columns, of which
+                the first three are used, with values in the pixel format of
+                the canvas.
+    :param nan_color: Color of masked pixels, in the pixel format of the
+                      canvas.
+    :param canvas: C-contiguous canvas of shape ``(height, width, 3)`` and
+                   type `np.float64`, `np.float32` or `np.uint8`.
+    :param shape: Height and width of a window.
+    :param border: Border width of the grid.
+    :param grid_cols: Number of columns of the grid.
+    :param first: Index of the first window.
+    """
+    dtype = canvas.dtype
+    if not canvas.flags.c_contiguous:
+        raise ValueError('The canvas must be C-contiguous')
+    lut = np.ascontiguousarray(np.asarray(lut)[:, :3], dtype=dtype)
+    nan_color = np.ascontiguousarray(np.broadcast_to(nan_color, (3,)),
+                                     dtype=dtype)
+    nan_mask = np.asarray(nan_mask)
+    if nan_mask.dtype == np.bool_:
+        nan_mask = nan_mask.view(np.uint8)
+
+    if first + indices.shape[0] > (canvas.shape[0] - border) // \
+            (shape[0] + border) * grid_cols:
+        raise ValueError('The windows do not fit in the canvas')
+
+    # Source row and column of each window row and column
+    rows = np.arange(shape[0], dtype=np.intp) * indices.shape[1] // shape[0]
+    cols = np.arange(shape[1], dtype=np.intp) * indices.shape[2] // shape[1]
+
+    _colormap_windows(indices, nan_mask, lut, nan_color, canvas, rows, cols,
+                      border, grid_cols, first)
@@ -0,0 +1,90 @@
+"""
+NumPy implementation of the kernels in the Cython extension
+`vzlog.image.resample`, with the same signatures and output, including the
+public `resample_and_arrange_image`. It is used when the extension is not
+available, see `vzlog.image.backend`.
+"""
+from __future__ import division, print_function, absolute_import
+import numpy as np
+
+
+def _index_tables(source_size, target_size):
+    """
+    Source row and column of each target row and column for nearest
+    neighbor resampling.
+    """
+    rows = (np.arange(target_size[0], dtype=np.intp) * source_size[0] //
+            target_size[0])
+    cols = (np.arange(target_size[1], dtype=np.intp) * source_size[1] //
+            target_size[1])
+    return rows[:, np.newaxis], cols
+
+
+def resample_and_arrange_image(image, nan_mask, target_size, lut,
+                               nan_color=None):
+    """
+    Resamples an image of lookup table indices to `target_size` using
+    nearest neighbor and maps it to RGB through `lut`. See
+    `vzlog.image.resample.resample_and_arrange_image`.
+    """
+    lut = np.asarray(lut)
+    dtype = np.uint8 if lut.dtype == np.uint8 else np.float64
+    lut = np.ascontiguousarray(lut[:, :3], dtype=dtype)
+    if nan_color is None:
+        if dtype == np.uint8:
+            raise ValueError('nan_color is required for np.uint8 output')
+        nan_color = np.nan
+
+    rows, cols = _index_tables(np.shape(image), target_size)
+    output = lut[np.asarray(image)[rows, cols]]
+    output[np.asarray(nan_mask, dtype=bool)[rows, cols]] = nan_color
+    return output
+
+
+def colormap_windows(indices, nan_mask, lut, nan_color, canvas, shape,
+                     border, grid_cols, first=0):
+    """
+    Colormaps a stack of images of lookup table indices and writes them into
+    consecutive windows of an image grid canvas. See
+    `vzlog.image.resample.colormap_windows`. Unlike the compiled kernel, the
+    canvas does not need to be C-contiguous.
+    """
+    dtype = canvas.dtype
+    N = indices.shape[0]
+    h, w = shape
+    b = border
+    grid_rows = (canvas.shape[0] - b) // (h + b)
+    if first + N > grid_rows * grid_cols:
+        raise ValueError('The windows do not fit in the canvas')
+
+    lut = np.asarray(lut)[:, :3].astype(dtype, copy=False)
+    indices = np.asarray(indices)
+    nan_mask = np.asarray(nan_mask, dtype=bool)
+    if indices.shape[1:] != (h, w):
+        rows, cols = _index_tables(indices.shape[1:], shape)
+        indices = indices[:, rows, cols]
+        nan_mask = nan_mask[:, rows, cols]
+
+    rgb = lut[indices]
+    rgb[nan_mask] = nan_color
+
+    # View of the canvas as (rows, h + b, cols, w + b, 3), so that whole
+    # rows of windows are written with one strided assignment
+    cells = canvas[b:b + (h + b) * grid_rows,
+                   b:b + (w + b) * grid_cols].reshape(
+                       (grid_rows, h + b, grid_cols, w + b, 3))
+
+    row, col = divmod(first, grid_cols)
+    n = 0
+    if col:
+        n = min(N, grid_cols - col)
+        cells[row, :h, col:col + n, :w] = rgb[:n].transpose(1, 0, 2, 3)
+        row += 1
+
+    full_rows, rest = divmod(N - n, grid_cols)
+    cells[row:row + full_rows, :h, :, :w] = (
+        rgb[n:n + full_rows * grid_cols]
+        .reshape(full_rows, grid_cols, h, w, 3).transpose(0, 2, 1, 3, 4))
+    n += full_rows * grid_cols
+    if rest:
+        cells[row + full_rows, :h, :rest, :w] = rgb[n:].transpose(1, 0, 2, 3)
@@ -0,0 +1,213 @@
+from __future__ import division, print_function, absolute_import
+import os
+import numpy as np
+from .color_image_grid import (_grid_layout, _border_width, _nanbounds,
+                               _save_pil)
+from .image_grid import ImageGrid, _default_cmap
+
+
+class TiledImageGrid(object):
+    """
+    An image grid that is rendered tile by tile into a multi-resolution
+    tile pyramid, for grids too large to hold as a single canvas or to show
+    as a single image. The layout is the same as for `ImageGrid`, but only
+    the windows that overlap a tile are colormapped when it is written.
+
+    Parameters
+    ----------
+    data : ndarray, ndim in [2, 3, 4]
+        See `ImageGrid`. The data is not copied, so it can be a memory-mapped
+        array or, if it is 3-dimensional, an array-like such as an HDF5
+        dataset. It should not be changed until the grid has been saved.
+    rows/cols/border_color/border_width/cmap/vmin/vmax/vsym/global_bounds :
+        See `ImageGrid`.
+    chunk_size : int
+        Number of images read at a time when inferring global bounds.
+    tile_size : int
+        Width and height of the tiles in pixels.
+    levels : int
+        See `ImageGrid.set_image`.
+
+    Examples
+    --------
+
+    >>> import vzlog
+    >>> import numpy as np
+    >>> data = np.load('patches.npy', mmap_mode='r')
+    >>> grid = vzlog.image.TiledImageGrid(data)
+    >>> vz.output(grid)
+    """
+    def __init__(self, data, rows=None, cols=None, border_color=1,
+                 border_width=None, cmap=None, vmin=None, vmax=None,
+                 vsym=False, global_bounds=True, tile_size=256,
+                 chunk_size=4096, levels=256):
+        assert np.ndim(data) in (2, 3, 4)
+        if np.ndim(data) != 3:
+            data = np.asanyarray(data)
+        data, rows, cols = _grid_layout(data, rows, cols)
+
+        if global_bounds and (vmin is None or vmax is None):
+            bounds = _nanbounds(data, chunk_size)
+            if vmin is None:
+                vmin = bounds[0]
+            if vmax is None:
+                vmax = bounds[1]
+
+            if vsym:
+                mx = max(abs(vmin), abs(vmax))
+                vmin = -mx
+                vmax = mx
+
+        self._data = data
+        self._rows = rows
+        self._cols = cols
+        self._shape = data.shape[1:3]
+        self._border_color = border_color
+        self._border = _border_width(border_width, rows, cols)
+        self._cmap = cmap if cmap is not None else _default_cmap(vsym)
+        self._vmin = vmin
+        self._vmax = vmax
+        self._vsym = vsym
+        self._levels = levels
+        self._tile_size = tile_size
+
+        b = self._border
+        self._fullsize = (b + (self._shape[0] + b) * rows,
+                          b + (self._shape[1] + b) * cols)
+
+    @property
+    def levels(self):
+        """
+        Number of levels of the pyramid. Level 0 has the full resolution and
+        each following level half the resolution of the previous, down to a
+        level that fits in a single tile.
+        """
+        size = max(self._fullsize)
+        levels = 1
+        while size > self._tile_size:
+            size = (size + 1) // 2
+            levels += 1
+        return levels
+
+    def render_tile(self, ty, tx):
+        """
+        Renders a tile of the full resolution level.
+
+        Parameters
+        ----------
+        ty/tx : int
+            Row and column of the tile.
+
+        Returns
+        -------
+        tile : ndarray, (height, width, 3), np.uint8
+            The tile, which is smaller than `tile_size` at the bottom and
+            right edges of the grid.
+        """
+        h, w = self._shape
+        b = self._border
+        T = self._tile_size
+        y0, x0 = ty * T, tx * T
+        y1 = min(y0 + T, self._fullsize[0])
+        x1 = min(x0 + T, self._fullsize[1])
+
+        # Windows whose frames overlap the tile
+        r0 = min(y0 // (h + b), self._rows - 1)
+        r1 = max(r0, -(-(y1 - b) // (h + b)) - 1)
+        c0 = min(x0 // (w + b), self._cols - 1)
+        c1 = max(c0, -(-(x1 - b) // (w + b)) - 1)
+
+        # The grid ends in the last row, so the windows that exist form a
+        # prefix of the sub-grid in row-major order
+        indices = (np.arange(r0, r1 + 1)[:, np.newaxis] * self._cols +
+                   np.arange(c0, c1 + 1)).ravel()
+        indices = indices[indices < self._data.shape[0]]
+
+        sub = ImageGrid(rows=r1 - r0 + 1, cols=c1 - c0 + 1,
+                        shape=self._shape, border_color=self._border_color,
+                        border_width=b, global_bounds=False, dtype=np.uint8)
+        if len(indices):
+            sub._set_images(np.asarray(self._data[indices]),
+                            cmap=self._cmap, vmin=self._vmin, vmax=self._vmax,
+                            vsym=self._vsym, levels=self._levels)
+
+        oy = r0 * (h + b)
+        ox = c0 * (w + b)
+        return sub.image[y0 - oy:y1 - oy, x0 - ox:x1 - ox]
+
+    def save(self, path, format='png', **options):
+        """
+        Writes the tile pyramid to the directory `path`, as files named
+        ``<level>/<row>_<col>.<format>``. Only a few tiles are held in
+        memory at a time. The coarser levels are made by downsampling the
+        tiles of the level before them.
+
+        Parameters
+        ----------
+        path : str
+            Output directory.
+        format : str
+            Image format of the tiles, used as their extension.
+        **options
+            Options of the PIL encoder. See `ImageGrid.save`.
+
+        Returns
+        -------
+        paths : list of str
+            Paths of the written tiles.
+        """
+        from PIL import Image
+        T = self._tile_size
+        paths = []
+
+        def tile_path(level, ty, tx):
+            return os.path.join(path, str(level),
+                                '{}_{}.{}'.format(ty, tx, format))
+
+        height, width = self._fullsize
+        prev_size = None
+        for level in range(self.levels):
+            level_path = os.path.join(path, str(level))
+            if not os.path.isdir(level_path):
+                os.makedirs(level_path)
+            for ty in range(-(-height // T)):
+                for tx in range(-(-width // T)):
+                    if level == 0:
+                        tile = Image.fromarray(self.render_tile(ty, tx))
+                    else:
+                        tile = self._downsampled_tile(
+                            [[tile_path(level - 1, 2 * ty + i, 2 * tx + j)
+                              for j in range(2)] for i in range(2)],
+                            prev_size, ty, tx)
+                    paths.append(tile_path(level, ty, tx))
+                    _save_pil(tile, paths[-1], options=options)
+            prev_size = (height, width)
+            height = -(-height // 2)
+            width = -(-width // 2)
+        return paths
+
+    def _downsampled_tile(self, quad, prev_size, ty, tx):
+        """
+        Combines the 2x2 block of tile files `quad` of a level of size
+        `prev_size` into the tile ``(ty, tx)`` of the next level.
+        """
+        from PIL import Image
+        T = self._tile_size
+        ph = min(2 * T, prev_size[0] - 2 * ty * T)
+        pw = min(2 * T, prev_size[1] - 2 * tx * T)
+        block = Image.new('RGB', (pw, ph))
+        for i in range(2):
+            for j in range(2):
+                if i * T < ph and j * T < pw:
+                    with Image.open(quad[i][j]) as part:
+                        block.paste(part.convert('RGB'), (j * T, i * T))
+        return block.resize((-(-pw // 2), -(-ph // 2)), Image.BOX)
+
+    def _vzlog_output_(self, vz):
+        vz.tiles(self)
+
+    def __repr__(self):
+        return ('TiledImageGrid(rows={rows}, cols={cols}, shape={shape}, '
+                'levels={levels})'.format(rows=self._rows, cols=self._cols,
+                                          shape=self._shape,
+                                          levels=self.levels))
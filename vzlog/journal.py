@@ -0,0 +1,237 @@
+"""
+Structured entries of a log and their rendering to HTML.
+
+Logging calls only create an `Entry` and append it to a journal. The HTML is
+produced later, when the page is written, by looking up a renderer for each
+entry's kind in `RENDERERS`.
+"""
+from __future__ import division, print_function, absolute_import
+
+import io
+import os
+import shutil
+
+__all__ = ['Entry', 'RENDERERS', 'render_entries', 'write_entries',
+           'remove_entry_files', 'format_text']
+
+# Size estimate of entries that only reference a file
+_LINK_SIZE = 64
+
+
+class Entry(object):
+    """
+    A logged entry.
+
+    :param kind: Key of the renderer in `RENDERERS`.
+    :param data: Tuple of arguments passed to the renderer.
+    :param size: Estimated length of the rendered HTML.
+    """
+    __slots__ = ('kind', 'data', 'size')
+
+    def __init__(self, kind, data, size):
+        self.kind = kind
+        self.data = data
+        self.size = size
+
+    def __repr__(self):
+        return 'Entry({!r}, {!r})'.format(self.kind, self.data)
+
+    @classmethod
+    def html(cls, html):
+        return cls('html', (html,), len(html))
+
+    @classmethod
+    def tag(cls, tag, text):
+        return cls('tag', (tag, text), len(text) + 2 * len(tag) + 6)
+
+    @classmethod
+    def items(cls, tree):
+        return cls('items', (tree,), _tree_size(tree))
+
+    @classmethod
+    def image(cls, fn, scale, thumb_fn=None, lazy=False):
+        return cls('image', (fn, scale, thumb_fn, lazy), 2 * _LINK_SIZE)
+
+    @classmethod
+    def figure(cls, svg_src, pdf_src, lazy=False):
+        return cls('figure', (svg_src, pdf_src, lazy), 2 * _LINK_SIZE)
+
+    @classmethod
+    def tiles(cls, base_fn, size, levels, tile_size, ext):
+        return cls('tiles', (base_fn, size, levels, tile_size, ext),
+                   4 * _LINK_SIZE)
+
+    @classmethod
+    def tabs(cls, tabs, encoding):
+        size = sum(os.path.getsize(path) for name, path in tabs)
+        return cls('tabs', (tabs, encoding), size)
+
+
+def format_text(*args, **kwargs):
+    """
+    Formats arguments to a string the way `print` would.
+    """
+    sep = kwargs.get('sep')
+    end = kwargs.get('end')
+    return ((' ' if sep is None else sep).join(str(arg) for arg in args) +
+            ('\n' if end is None else end))
+
+
+def _tree_size(tree):
+    open_tag, close_tag, children = tree
+    return sum(len(c) + 12 if isinstance(c, str) else _tree_size(c)
+               for c in children) + 12
+
+
+def render_entries(entries, renderers=None):
+    """
+    Renders a sequence of entries to HTML. Entries of kinds that are in
+    `renderers` use those renderers instead of the ones in `RENDERERS`.
+    """
+    if renderers is None:
+        renderers = RENDERERS
+    else:
+        renderers = dict(RENDERERS, **renderers)
+    return ''.join(renderers[e.kind](renderers, *e.data) for e in entries)
+
+
+def write_entries(f, entries, encoding):
+    """
+    Renders a sequence of entries to the binary file `f`. The contents of
+    tabs are copied from their files, instead of being read into memory.
+    """
+    parts = []
+    for e in entries:
+        if e.kind == 'tabs':
+            f.write(''.join(parts).encode(encoding))
+            parts = []
+            for text, path in _tabs_parts(*e.data):
+                if path is None:
+                    f.write(text.encode(encoding))
+                else:
+                    with open(path, 'rb') as tab_f:
+                        shutil.copyfileobj(tab_f, f)
+        else:
+            parts.append(RENDERERS[e.kind](RENDERERS, *e.data))
+    f.write(''.join(parts).encode(encoding))
+
+
+def remove_entry_files(entries):
+    """
+    Deletes the files holding the contents of tabs, once the entries will
+    not be rendered again.
+    """
+    for e in entries:
+        if e.kind == 'tabs':
+            for name, path in e.data[0]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def _render_html(renderers, html):
+    return html
+
+
+def _render_tag(renderers, tag, text):
+    return '<{0}>\n{1}</{0}>\n'.format(tag, text)
+
+
+def _render_items(renderers, tree):
+    open_tag, close_tag, children = tree
+    parts = [open_tag + '\n']
+    for child in children:
+        if isinstance(child, str):
+            parts.append('<li>\n' + child + '</li>\n')
+        else:
+            parts.append(_render_items(renderers, child))
+    parts.append(close_tag + '\n')
+    return ''.join(parts)
+
+
+def _render_image(renderers, fn, scale, thumb_fn=None, lazy=False):
+    if scale != 1.0:
+        scale_str = ('width="{:.2f}%" height="{:.2f}%" '
+                     .format(scale * 100.0, scale * 100.0))
+    else:
+        scale_str = ''
+    if thumb_fn is not None:
+        # Fall back to the full image if the thumbnail is not written yet
+        img = ('<a href="{0}"><img src="{1}" loading="lazy" '
+               'onerror="this.onerror=null;this.src=\'{0}\'" {2}/></a>'
+               .format(fn, thumb_fn, scale_str))
+    elif lazy:
+        img = '<img src="{}" loading="lazy" {}/>'.format(fn, scale_str)
+    else:
+        img = '<img src="{}" {}/>'.format(fn, scale_str)
+    return '<div><div class="wrapper">\n{}\n</div></div>\n'.format(img)
+
+
+def _render_figure(renderers, svg_src, pdf_src, lazy=False):
+    return """<div>
+
+            <img src="{0}" {2}/>
+            <div><a href="{1}">pdf</a></div>
+</div>
+""".format(svg_src, pdf_src, 'loading="lazy" ' if lazy else '')
+
+
+def _render_tiles(renderers, base_fn, size, levels, tile_size, ext):
+    height, width = size
+    return ('<div class="tiles" style="width: {}px; height: {}px"></div>\n'
+            '<script>\n'
+            'vzlogTiles(document.currentScript.previousElementSibling, '
+            '"{}", {}, {}, {}, {}, "{}");\n'
+            '</script>\n'.format(min(width, 800), min(height, 600), base_fn,
+                                  width, height, levels, tile_size, ext))
+
+
+def _tabs_parts(tabs, encoding):
+    """
+    Yields the HTML of tabs as pairs of ``(text, None)`` for markup and
+    ``(None, path)`` for files holding the rendered contents of a tab.
+    """
+    yield '<div class="tabs" id="tabs">\n', None
+
+    # Print links
+    yield '<ul>\n', None
+    for no, (name, path) in enumerate(tabs):
+        yield '<li><a href="#tabs-{no}">{name}</a></li>\n'.format(
+              no=no+1, name=name), None
+    yield '</ul>\n', None
+
+    # Output tab divs
+    for no, (name, path) in enumerate(tabs):
+        yield '<div class="tab" id="tabs-{}">\n'.format(no+1), None
+        yield None, path
+        yield '\n</div>\n', None
+
+    yield '''</div>
+
+          <script>
+          vzlogTabs(document.currentScript.previousElementSibling);
+          </script>
+        \n''', None
+
+
+def _render_tabs(renderers, tabs, encoding):
+    parts = []
+    for text, path in _tabs_parts(tabs, encoding):
+        if path is None:
+            parts.append(text)
+        else:
+            with io.open(path, encoding=encoding) as f:
+                parts.append(f.read())
+    return ''.join(parts)
+
+
+RENDERERS = {
+    'html': _render_html,
+    'tag': _render_tag,
+    'items': _render_items,
+    'image': _render_image,
+    'figure': _render_figure,
+    'tiles': _render_tiles,
+    'tabs': _render_tabs,
+}
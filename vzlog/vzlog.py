@@ -2,14 +2,16 @@ from __future__ import division, print_function, absolute_import
 
 import os
 import sys
-from copy import copy
 from string import Template
 from contextlib import contextmanager
 import time
-from io import StringIO
-from collections import OrderedDict
+import itertools
+import threading
+from collections import OrderedDict, deque
+from vzlog.journal import (Entry, format_text, remove_entry_files,
+                           render_entries, write_entries)
 
-__all__ = ['VzLog']
+__all__ = ['VzLog', 'merge_shards']
 
 _HEADER = """
 <!DOCTYPE html>
@@ -43,21 +45,444 @@ _HEADER = """
         image-rendering: optimize-contrast;
         -ms-interpolation-mode: nearest-neighbor;
     }
+
+    div.tabs > ul {
+        list-style: none;
+        margin: 0;
+        padding: 0;
+        border-bottom: 1px solid #aaa;
+    }
+
+    div.tabs > ul > li {
+        display: inline-block;
+        margin: 0 2px -1px 0;
+    }
+
+    div.tabs > ul > li > a {
+        display: block;
+        padding: 4px 10px;
+        border: 1px solid #aaa;
+        background: #eee;
+        color: #333;
+        text-decoration: none;
+    }
+
+    div.tabs > ul > li.active > a {
+        background: white;
+        border-bottom-color: white;
+    }
+
+    div.tiles {
+        position: relative;
+        overflow: hidden;
+        cursor: move;
+        border: 1px solid #aaa;
+    }
+
+    div.tiles > img {
+        position: absolute;
+        image-rendering: pixelated;
+    }
     </style>
-    <script src="https://ajax.googleapis.com/ajax/libs/jquery/2.1.3/jquery.min.js"></script>
-    <script src="https://ajax.googleapis.com/ajax/libs/jqueryui/1.11.4/jquery-ui.min.js"></script>
-    <link rel="stylesheet" href="https://ajax.googleapis.com/ajax/libs/jqueryui/1.11.4/themes/smoothness/jquery-ui.css">
+    <script>
+    // Shows one tab at a time of a div.tabs element
+    function vzlogTabs(tabs) {
+        var links = tabs.querySelectorAll(':scope > ul > li > a');
+        function show(hash) {
+            for (var i = 0; i < links.length; i++) {
+                var href = links[i].getAttribute('href');
+                var active = href === hash;
+                links[i].parentNode.className = active ? 'active' : '';
+                tabs.querySelector(href).style.display = active ? '' : 'none';
+            }
+        }
+        for (var i = 0; i < links.length; i++) {
+            links[i].onclick = function(e) {
+                e.preventDefault();
+                show(this.getAttribute('href'));
+            };
+        }
+        if (links.length) {
+            show(links[0].getAttribute('href'));
+        }
+    }
+
+    // Pan (drag) and zoom (scroll) viewer of a tile pyramid
+    function vzlogTiles(el, base, width, height, levels, size, ext) {
+        var zoom = Math.min(1, el.clientWidth / width,
+                            el.clientHeight / height);
+        var x = 0, y = 0, drag = null, shown = {};
+        function draw() {
+            var level = Math.floor(-Math.log2(zoom));
+            level = Math.max(0, Math.min(levels - 1, level));
+            var f = Math.pow(2, level);
+            var lw = Math.ceil(width / f), lh = Math.ceil(height / f);
+            var tx0 = Math.max(0, Math.floor(x / f / size));
+            var ty0 = Math.max(0, Math.floor(y / f / size));
+            var x1 = x + el.clientWidth / zoom;
+            var y1 = y + el.clientHeight / zoom;
+            var tx1 = Math.min(Math.ceil(lw / size), Math.ceil(x1 / f / size));
+            var ty1 = Math.min(Math.ceil(lh / size), Math.ceil(y1 / f / size));
+            var keep = {};
+            for (var ty = ty0; ty < ty1; ty++) {
+                for (var tx = tx0; tx < tx1; tx++) {
+                    var key = level + '/' + ty + '_' + tx;
+                    var img = shown[key];
+                    if (!img) {
+                        img = document.createElement('img');
+                        img.src = base + '/' + key + '.' + ext;
+                        el.appendChild(img);
+                        shown[key] = img;
+                    }
+                    img.style.left = (tx * size * f - x) * zoom + 'px';
+                    img.style.top = (ty * size * f - y) * zoom + 'px';
+                    var w = Math.min(size, lw - tx * size);
+                    var h = Math.min(size, lh - ty * size);
+                    img.style.width = w * f * zoom + 'px';
+                    img.style.height = h * f * zoom + 'px';
+                    keep[key] = true;
+                }
+            }
+            for (var key in shown) {
+                if (!keep[key]) {
+                    el.removeChild(shown[key]);
+                    delete shown[key];
+                }
+            }
+        }
+        el.onwheel = function(e) {
+            e.preventDefault();
+            var r = el.getBoundingClientRect();
+            var px = e.clientX - r.left, py = e.clientY - r.top;
+            var cx = x + px / zoom, cy = y + py / zoom;
+            zoom *= e.deltaY < 0 ? 1.25 : 0.8;
+            x = cx - px / zoom;
+            y = cy - py / zoom;
+            draw();
+        };
+        el.onmousedown = function(e) {
+            e.preventDefault();
+            drag = [e.clientX, e.clientY];
+        };
+        window.addEventListener('mousemove', function(e) {
+            if (drag) {
+                x -= (e.clientX - drag[0]) / zoom;
+                y -= (e.clientY - drag[1]) / zoom;
+                drag = [e.clientX, e.clientY];
+                draw();
+            }
+        });
+        window.addEventListener('mouseup', function() { drag = null; });
+        draw();
+    }
+    </script>
 </head>
 <body>
 """
 
-# Currently not used
+# Smallest number of registered files that triggers setting file rights
+_MIN_RIGHTS_BATCH = 64
+
+# Smallest number of pending thumbnails that triggers writing them
+_MIN_THUMBNAIL_BATCH = 16
+
+# Extensions of images that get thumbnails
+_THUMBNAIL_EXTS = ('png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp')
+
+# Kept after the content on disk, so that the page is always complete
 _FOOTER = """
 </body>
 </html>
 """
 
 
+def _is_ready(entry):
+    """
+    Returns whether an entry can be rendered without waiting for any of its
+    images to be encoded.
+    """
+    return all(getattr(value, 'ready', True) for value in entry.data)
+
+
+class _HTMLStream(object):
+    """
+    Append-only writer for an HTML page. Entries are appended to a journal
+    and rendered to the file in large chunks when any of the flush thresholds
+    is reached. After each chunk, the footer is written after the content, so
+    that the file is always a complete page. The next chunk overwrites the
+    footer.
+
+    :param flush_entries: Flush after this many entries, or never if None.
+    :param flush_seconds: Flush at most this long after an entry was written,
+                          or only on the other thresholds if None.
+    :param flush_bytes: Flush when the unwritten entries are estimated to
+                        render to this many characters, or never if None.
+    :param keep_journal: If False, entries are dropped once they are written.
+
+    Files holding the contents of tabs are deleted once their entries are
+    dropped, or when the stream is closed.
+
+    Entries that refer to images still being encoded are not ready yet. A
+    flush only writes up to the first of them and leaves the rest for a
+    later flush, so that it never waits for the encoders.
+    """
+    def __init__(self, path, footer, encoding='utf-8', flush_entries=None,
+                 flush_seconds=1.0, flush_bytes=2**16, keep_journal=True):
+        self._encoding = encoding
+        self._keep_journal = keep_journal
+        self._flush_entries = flush_entries
+        self._flush_seconds = flush_seconds
+        self._flush_bytes = flush_bytes
+        self._timer = None
+        self._lock = threading.Lock()
+        self._open(path, footer)
+
+    def _open(self, path, footer):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._footer = footer.encode(self._encoding)
+        self.journal = []
+        self.size = 0
+        self.count = 0
+        self._rendered = 0
+        self._buffered_bytes = 0
+        self._pos = 0
+
+    def reopen(self, path, footer, final_footer=None):
+        """
+        Finishes the current file, ending it with `final_footer` if given, and
+        continues in a new file with an empty journal.
+        """
+        if final_footer is not None:
+            with self._lock:
+                self._footer = final_footer.encode(self._encoding)
+                # The entries may all be written already
+                if self._file is not None:
+                    self._write_footer()
+        self.close()
+        with self._lock:
+            self._open(path, footer)
+
+    def append(self, entry):
+        """
+        Appends an entry and flushes if a threshold is reached.
+        """
+        # The lock is only contended while the timer flushes
+        with self._lock:
+            self.journal.append(entry)
+            self.size += entry.size
+            self.count += 1
+            self._buffered_bytes += entry.size
+            full = ((self._flush_entries is not None and
+                     len(self.journal) - self._rendered >=
+                     self._flush_entries) or
+                    (self._flush_bytes is not None and
+                     self._buffered_bytes >= self._flush_bytes))
+            # Nothing can be written while the first unwritten entry waits
+            # for its image, so leave it to the timer
+            if full and not _is_ready(self.journal[self._rendered]):
+                full = False
+            if not full:
+                self._arm_timer()
+        if full:
+            self.flush()
+
+    def _arm_timer(self):
+        """
+        Starts the flush timer unless it is already running. Must be called
+        with the lock held.
+        """
+        if self._flush_seconds is not None and self._timer is None:
+            self._timer = threading.Timer(self._flush_seconds,
+                                          self._timer_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timer_flush(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+
+    def flush(self, wait=False):
+        """
+        Writes the entries that are ready. If `wait` is True, all entries
+        are written, waiting for their images to be encoded.
+        """
+        with self._lock:
+            if self._file is None:
+                return
+            end = self._rendered
+            while (end < len(self.journal) and
+                   (wait or _is_ready(self.journal[end]))):
+                end += 1
+            if end < len(self.journal):
+                # Try again for the entries that are held back
+                self._arm_timer()
+            elif self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if end == self._rendered:
+                return
+
+            entries = self.journal[self._rendered:end]
+            self._file.seek(self._pos)
+            write_entries(self._file, entries, self._encoding)
+            self._pos = self._file.tell()
+            if self._keep_journal:
+                self._rendered = end
+            else:
+                remove_entry_files(entries)
+                del self.journal[:end]
+            self._buffered_bytes -= sum(e.size for e in entries)
+            self._write_footer()
+
+    def _write_footer(self):
+        """
+        Ends the file with the footer after the written entries. Must be
+        called with the lock held.
+        """
+        self._file.seek(self._pos)
+        self._file.write(self._footer)
+        self._file.truncate()
+        self._file.flush()
+
+    def close(self):
+        self.flush(wait=True)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                # The page will not be rendered again
+                remove_entry_files(self.journal)
+
+
+def _array_to_pil(data, scale):
+    import numpy as np
+    from PIL import Image
+    from vzlog.image.color_image_grid import _as_pixels, _upscale
+    data = _as_pixels(data, np.uint8)
+    if scale != 1:
+        data = _upscale(data, scale)
+    return Image.fromarray(data)
+
+
+def _as_array(im):
+    """
+    Returns the pixels of an array, image grid or PIL image as an array.
+    """
+    import numpy as np
+    if hasattr(im, 'getbands'):
+        if im.mode not in ('L', 'RGB', 'RGBA'):
+            im = im.convert('RGBA' if 'A' in im.getbands() else 'RGB')
+    elif hasattr(im, 'image'):
+        im = im.image
+    return np.array(im)
+
+
+def _save_array(data, path, scale, options=None, thumb_path=None,
+                thumb_size=None):
+    from vzlog.image.color_image_grid import _save_pil
+    pil_im = _array_to_pil(data, scale)
+    _save_pil(pil_im, path, options=options)
+    if thumb_path is not None:
+        pil_im.thumbnail((thumb_size, thumb_size))
+        _save_pil(pil_im, thumb_path)
+
+
+def _save_thumbnail(path, thumb_path, thumb_size):
+    from PIL import Image
+    from vzlog.image.color_image_grid import _save_pil
+    pil_im = Image.open(path)
+    pil_im.thumbnail((thumb_size, thumb_size))
+    _save_pil(pil_im, thumb_path)
+
+
+def _encode_array(data, scale, options, ext):
+    from io import BytesIO
+    from vzlog.image.color_image_grid import _save_pil
+    b = BytesIO()
+    _save_pil(_array_to_pil(data, scale), b, ext, options)
+    return b.getvalue()
+
+
+def _encode_figure(fig, ext):
+    from io import BytesIO
+    b = BytesIO()
+    fig.savefig(b, format=ext)
+    return b.getvalue()
+
+
+class _Asset(object):
+    """
+    Source of an image that is encoded in the background. It formats as its
+    URL, which is either a data URI or a file name, and waits for the
+    encoding to finish if needed. This lets the entry be logged right away
+    and rendered once the URL is known.
+    """
+    def __init__(self):
+        self._src = None
+        self._done = threading.Event()
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def set(self, src):
+        self._src = src
+        self._done.set()
+
+    def __str__(self):
+        self._done.wait()
+        return self._src
+
+
+def _thumbnail_name(fn):
+    base, ext = os.path.splitext(fn)
+    return base + '.thumb' + ext
+
+
+def _write_payloads(paths, payloads):
+    for path, payload in zip(paths, payloads):
+        with open(path, 'wb') as f:
+            f.write(payload)
+
+
+def merge_shards(path, name=None, encoding='utf-8'):
+    """
+    Combines the pages written by logs created with `shard` in the directory
+    `path` into ``index.html``. Each shard gets a section, in sorted order of
+    the shard names. Call this once all processes are done logging.
+
+    >>> merge_shards('mylog')
+
+    :param path: Path to the directory of the log.
+    :param name: Document title. Inferred from `path` if set to `None`.
+    """
+    import io
+    root = os.path.abspath(path)
+    if name is None:
+        name = os.path.basename(root)
+
+    shard_fns = sorted(fn for fn in os.listdir(root)
+                       if fn.startswith('shard-') and fn.endswith('.html'))
+
+    page = _HTMLStream(os.path.join(root, 'index.html'), _FOOTER,
+                       encoding=encoding, flush_seconds=None)
+    page.append(Entry.html(Template(_HEADER).substitute(title=name,
+                                                        encoding=encoding)))
+    for fn in shard_fns:
+        with io.open(os.path.join(root, fn), encoding=encoding) as f:
+            html = f.read()
+        if '</body>' not in html:
+            # Nothing has been written to this shard yet
+            continue
+        start = html.index('<body>') + len('<body>')
+        body = html[start:html.rindex('</body>')]
+        page.append(Entry.html('<div class="shard">\n<h2>{}</h2>\n{}</div>\n'
+                               .format(fn[6:-5], body)))
+    page.close()
+
+
 class VzLog:
     """
     Logging class that manages an HTML log file. Mainly used for visually rich
@@ -66,24 +491,117 @@ class VzLog:
     :param path: Path the directory where the files will be saved.
     :param name: Specify name of the output document. This will be used to set
                  the document title. Inferred from `path` if set to `None`.
-
+    :param workers: Number of background threads that encode and write images
+                    logged through `image` and `savefig`. If 0, images are
+                    written immediately.
+    :param max_queued_bytes: Upper bound on the memory held by images
+                             waiting to be written. Logging an image blocks
+                             while the queue is full.
+    :param flush_entries: Write the page to disk after this many entries.
+                          None disables this threshold.
+    :param flush_seconds: Write the page to disk at most this many seconds
+                          after an entry was logged. None disables this
+                          threshold.
+    :param flush_bytes: Write the page to disk when this many characters are
+                        buffered. None disables this threshold.
+    :param shard: Name or integer rank of this process, when several processes
+                  log into the same directory. Each shard writes its own page
+                  ``shard-<shard>.html`` and prefixes its files with the shard
+                  name, so processes never touch the same file. The directory
+                  is not cleared in this mode. Use `merge_shards` to combine
+                  the shards into ``index.html``. Processes that exit without
+                  running `atexit` handlers, such as `multiprocessing`
+                  workers, should call `close` when done. Cannot be combined
+                  with pagination.
+    :param page_entries: Start a new page after this many entries.
+    :param page_bytes: Start a new page when the current one is estimated to
+                       have reached this many characters.
+    :param thumbnails: If set, images are shown as thumbnails no larger than
+                       this many pixels on each side, linking to the full
+                       image, and the browser loads all images lazily.
+                       Thumbnails are written next to the images, by the
+                       background workers if there are any.
+    :param embed_bytes: If set, images logged with `image` and figures logged
+                        with `savefig` are encoded in memory. Those of at
+                        most this many bytes are embedded in the page as data
+                        URIs, and larger ones are written to files named by
+                        the hash of their content, so that identical images
+                        are stored only once. Thumbnails are not made for
+                        these images.
+    :param threadsafe: Allow logging from several threads. Entries are
+                       formatted by the calling thread and appended to a
+                       queue that a single writer thread drains, so entries
+                       from one thread keep their order and are never
+                       interleaved with others.
+    :param keep_journal: Keep the entries of the current page in memory
+                         after they are written, so that `render` can render
+                         the page again. Otherwise, they are dropped once
+                         written.
+
+    Logged entries are collected in a journal and rendered to HTML when the
+    page is written. Whenever the page is written, it is closed with the
+    footer, so it can be viewed at any time during the run.
+
+    If `page_entries` or `page_bytes` is set, the log is split into pages
+    ``page-0001.html``, ``page-0002.html``, etc., linked to each other, and
+    ``index.html`` lists the pages. Entries of finished pages are not kept in
+    memory.
     """
-    def __init__(self, path, name=None, file_rights=None, encoding='utf-8'):
+    def __init__(self, path, name=None, file_rights=None, encoding='utf-8',
+                 workers=0, max_queued_bytes=256 * 2**20, flush_entries=None,
+                 flush_seconds=1.0, flush_bytes=2**16, shard=None,
+                 page_entries=None, page_bytes=None, thumbnails=None,
+                 embed_bytes=None, threadsafe=False, keep_journal=False):
         self._root = os.path.abspath(path)
         if name is None:
             self._name = os.path.basename(path)
         else:
             self._name = name
         self._file_rights = file_rights
+        if shard is None:
+            self._page_fn = 'index.html'
+            self._asset_prefix = ''
+        else:
+            if isinstance(shard, int):
+                shard = '{:04}'.format(shard)
+            self._page_fn = 'shard-{}.html'.format(shard)
+            self._asset_prefix = '{}-'.format(shard)
+        self._shard = shard
+        self._paginate = page_entries is not None or page_bytes is not None
+        if self._paginate and shard is not None:
+            raise ValueError('Pagination is not supported for shards')
+        self._page_entries = page_entries
+        self._page_bytes = page_bytes
+        self._thumbnails = thumbnails
+        self._pending_thumbnails = []
+        self._thumbnail_lock = threading.Lock()
+        self._thumbnail_threshold = _MIN_THUMBNAIL_BATCH
+        self._embed_bytes = embed_bytes
         if self._file_rights is not None:
             self._file_rights = int(self._file_rights, 8)
-        self._filename_stack = set()
+        self._filename_stack = []
+        self._rights_lock = threading.Lock()
+        self._rights_threshold = _MIN_RIGHTS_BATCH
         self._open = False
         self._encoding = encoding
         self._main_file = None
+        self._workers = workers
+        self._max_queued_bytes = max_queued_bytes
+        self._executor = None
+        self._queue_cond = None
+        self._queued_bytes = 0
+        self._queued_jobs = 0
+        self._errors = []
+        self._executor_lock = threading.Lock()
+        self._entry_queue = None
+        self._flush_policy = dict(flush_entries=flush_entries,
+                                  flush_seconds=flush_seconds,
+                                  flush_bytes=flush_bytes)
+        self._keep_journal = keep_journal
         self.clear()
 
-        self._counter = 0
+        if threadsafe:
+            self._start_writer()
 
         # Make flush unnecessary to call manually
         import atexit
@@ -100,22 +618,269 @@ class VzLog:
         return self._root
 
     def open_main_file(self):
-        self._main_file = open(os.path.join(self._root, 'index.html'), 'w')
+        if self._paginate:
+            self._page_no = 1
+            self._page_fn = 'page-{:04}.html'.format(self._page_no)
+            footer = self._page_nav() + _FOOTER
+        else:
+            footer = _FOOTER
+        self._main_file = _HTMLStream(os.path.join(self._root, self._page_fn),
+                                      footer, encoding=self._encoding,
+                                      keep_journal=self._keep_journal,
+                                      **self._flush_policy)
         self._cur_file = self._main_file
         self._tabs = None
 
+    def _page_nav(self, last=True):
+        """
+        Returns links to the index and the neighboring pages of the current
+        page. If `last` is True, the current page has no next page yet.
+        """
+        links = []
+        if self._page_no > 1:
+            links.append('<a href="page-{:04}.html">previous</a>'.format(
+                         self._page_no - 1))
+        links.append('<a href="index.html">index</a>')
+        if not last:
+            links.append('<a href="page-{:04}.html">next</a>'.format(
+                         self._page_no + 1))
+        return '<div class="pages">{}</div>\n'.format(' | '.join(links))
+
+    def _start_page(self):
+        """
+        Outputs the header of a new page to the main file.
+        """
+        title = self._name
+        if self._paginate:
+            title = '{} - page {}'.format(self._name, self._page_no)
+        h = Template(_HEADER).substitute(title=title,
+                                         encoding=self._encoding)
+        if self._paginate:
+            h += '\n' + self._page_nav()
+            self._write_index()
+        self._main_file.append(Entry.html(h + '\n'))
+
+    def _next_page(self):
+        final_footer = self._page_nav(last=False) + _FOOTER
+        self._register_filename(os.path.join(self._root, self._page_fn))
+        self._page_no += 1
+        self._page_fn = 'page-{:04}.html'.format(self._page_no)
+        self._main_file.reopen(os.path.join(self._root, self._page_fn),
+                               self._page_nav() + _FOOTER,
+                               final_footer=final_footer)
+        self._start_page()
+
+    def _write_index(self):
+        """
+        Writes ``index.html``, which lists all pages of a paginated log.
+        """
+        path = os.path.join(self._root, 'index.html')
+        links = ''.join('<li><a href="page-{0:04}.html">Page {0}</a></li>\n'
+                        .format(no) for no in range(1, self._page_no + 1))
+        html = (Template(_HEADER).substitute(title=self._name,
+                                             encoding=self._encoding) +
+                '\n<h1>{}</h1>\n<ul>\n{}</ul>\n'.format(self._name, links) +
+                _FOOTER)
+        # Replace the old index in one step, so that it is always complete
+        with open(path + '.tmp', 'wb') as f:
+            f.write(html.encode(self._encoding))
+        os.replace(path + '.tmp', path)
+        self._register_filename(path)
+
+    def _next_asset_name(self):
+        """
+        Returns a new file name (without extension) for an asset of the log.
+        """
+        # Taking the next value of a count is atomic, so this is thread-safe
+        self._counter = next(self._asset_ids) + 1
+        return '{}plot-{:04}'.format(self._asset_prefix, self._counter - 1)
+
     def _register_filename(self, fn):
-        self._filename_stack.add(fn)
+        """
+        Registers a file that should be given the file rights once it exists.
+        Registered files are processed in batches, and a batch is only run
+        once the number of pending files has doubled since the last one, so
+        that each file costs amortized O(1) system calls.
+        """
+        if self._file_rights is None:
+            return
+        with self._rights_lock:
+            self._filename_stack.append(fn)
+            run = len(self._filename_stack) >= self._rights_threshold
+        if run:
+            self._update_rights()
 
     def _set_rights(self, fn):
         if self._file_rights is not None:
             return os.chmod(fn, self._file_rights)
 
     def _update_rights(self):
-        for fn in copy(self._filename_stack):
-            if os.path.exists(fn):
+        with self._rights_lock:
+            filenames, self._filename_stack = self._filename_stack, []
+
+        pending = []
+        for fn in filenames:
+            try:
                 self._set_rights(fn)
-                self._filename_stack.remove(fn)
+            except OSError:
+                # Not created yet
+                pending.append(fn)
+
+        with self._rights_lock:
+            self._filename_stack.extend(pending)
+            self._rights_threshold = max(_MIN_RIGHTS_BATCH,
+                                         2 * len(self._filename_stack))
+
+    def _queue_thumbnail(self, path, thumb_path):
+        """
+        Queues a thumbnail to be made of an image that will be written by the
+        caller. Like file rights, pending thumbnails are processed in batches
+        whenever their number has doubled.
+        """
+        with self._thumbnail_lock:
+            self._pending_thumbnails.append((path, thumb_path))
+            run = len(self._pending_thumbnails) >= self._thumbnail_threshold
+        if run:
+            self._update_thumbnails()
+
+    def _update_thumbnails(self):
+        with self._thumbnail_lock:
+            pending, self._pending_thumbnails = self._pending_thumbnails, []
+
+        remaining = []
+        for path, thumb_path in pending:
+            if os.path.exists(path):
+                self._submit(4 * os.path.getsize(path), _save_thumbnail,
+                             path, thumb_path, self._thumbnails)
+            else:
+                remaining.append((path, thumb_path))
+
+        with self._thumbnail_lock:
+            self._pending_thumbnails.extend(remaining)
+            self._thumbnail_threshold = max(
+                _MIN_THUMBNAIL_BATCH, 2 * len(self._pending_thumbnails))
+
+    def _store_assets(self, encode, assets, *args):
+        """
+        Encodes one or more images with ``encode(*args, ext)`` for each pair
+        of `assets`, ``(asset, ext)``, and stores them according to
+        `embed_bytes`.
+        """
+        import base64
+        import hashlib
+        import mimetypes
+        try:
+            for asset, ext in assets:
+                payload = encode(*(args + (ext,)))
+                if len(payload) <= self._embed_bytes:
+                    mime = mimetypes.guess_type('image.' + ext)[0]
+                    asset.set('data:{};base64,{}'.format(
+                              mime, base64.b64encode(payload).decode('ascii')))
+                    continue
+
+                fn = '{}.{}'.format(hashlib.sha1(payload).hexdigest(), ext)
+                if fn not in self._stored_assets:
+                    self._stored_assets.add(fn)
+                    path = os.path.join(self._root, fn)
+                    # Other shards may write the same file at the same time
+                    tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+                    with open(tmp_path, 'wb') as f:
+                        f.write(payload)
+                    os.replace(tmp_path, path)
+                    self._register_filename(path)
+                asset.set(fn)
+        finally:
+            # Never leave the page waiting for an asset that failed
+            for asset, ext in assets:
+                if not asset._done.is_set():
+                    asset.set('')
+
+    def _submit(self, nbytes, fn, *args):
+        """
+        Runs ``fn(*args)`` on a background thread, or immediately if there are
+        no workers. `nbytes` is the memory held by the job until it is done.
+        """
+        if not self._workers:
+            fn(*args)
+            return
+
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            with self._executor_lock:
+                if self._executor is None:
+                    self._queue_cond = threading.Condition()
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self._workers)
+
+        with self._queue_cond:
+            while (self._queued_jobs and
+                   self._queued_bytes + nbytes > self._max_queued_bytes):
+                self._queue_cond.wait()
+            self._queued_bytes += nbytes
+            self._queued_jobs += 1
+
+        def done(future):
+            with self._queue_cond:
+                if future.exception() is not None:
+                    self._errors.append(future.exception())
+                self._queued_bytes -= nbytes
+                self._queued_jobs -= 1
+                self._queue_cond.notify_all()
+
+        self._executor.submit(fn, *args).add_done_callback(done)
+
+    def _start_writer(self):
+        self._entry_queue = deque()
+        self._wake = threading.Event()
+        self._writer_awake = True
+        writer = threading.Thread(target=self._writer_loop,
+                                  name='vzlog-writer')
+        writer.daemon = True
+        writer.start()
+
+    def _writer_loop(self):
+        queue = self._entry_queue
+        while True:
+            self._writer_awake = True
+            while queue:
+                target, entry = queue.popleft()
+                if target is None:
+                    # Marker from _drain
+                    entry.set()
+                    continue
+                try:
+                    self._write_entry(target, entry)
+                except Exception as e:
+                    self._errors.append(e)
+            self._writer_awake = False
+            # An entry appended before the flag was cleared is caught here,
+            # and one appended after it sets the event.
+            if not queue:
+                self._wake.wait(0.1)
+            self._wake.clear()
+
+    def _drain(self):
+        """
+        Waits until the writer thread has written all queued entries.
+        """
+        if self._entry_queue is not None:
+            done = threading.Event()
+            self._entry_queue.append((None, done))
+            self._wake.set()
+            done.wait()
+
+    def _wait(self):
+        """
+        Waits for all background writes to finish, and re-raises the first
+        error that occurred in any of them.
+        """
+        if self._queue_cond is not None:
+            with self._queue_cond:
+                while self._queued_jobs:
+                    self._queue_cond.wait()
+        if self._errors:
+            errors, self._errors = self._errors, []
+            raise errors[0]
 
     def clear(self):
         """
@@ -126,54 +891,118 @@ class VzLog:
         # Construct path.
         dot_vz_fn = os.path.join(self._root, '.vz')
 
+        self._drain()
         if self._main_file:
             self._main_file.close()
 
-        # First, remove previous folder. Only do this if it looks like
-        # it was previously created with vz. Otherwise, throw an error.
-        if os.path.isdir(self._root):
-            # Check if it has a '.vz' file
-            if os.path.exists(dot_vz_fn):
-                # Delete the whole directory
-                import shutil
-                shutil.rmtree(self._root)
-            else:
+        self._wait()
+
+        if self._shard is None:
+            # First, remove previous folder. Only do this if it looks like
+            # it was previously created with vz. Otherwise, throw an error.
+            if os.path.isdir(self._root):
+                # Check if it has a '.vz' file
+                if os.path.exists(dot_vz_fn):
+                    # Delete the whole directory
+                    import shutil
+                    shutil.rmtree(self._root)
+                else:
+                    raise Exception("Folder does not seem to be a vz folder.")
+
+            # Create folder
+            os.mkdir(self._root)
+        else:
+            # Other shards may be creating the folder at the same time. An
+            # empty folder means that one of them has not written '.vz' yet.
+            if (os.path.isdir(self._root) and os.listdir(self._root) and
+                    not os.path.exists(dot_vz_fn)):
                 raise Exception("Folder does not seem to be a vz folder.")
+            try:
+                os.makedirs(self._root)
+            except OSError:
+                if not os.path.isdir(self._root):
+                    raise
 
-        # Create folder
-        os.mkdir(self._root)
+        with open(dot_vz_fn, 'w') as f:
+            print('ok', file=f)
 
         self.open_main_file()
 
         # Reset counter
         self._counter = 0
+        self._asset_ids = itertools.count()
+        self._tab_ids = itertools.count(1)
+        # Names of the files written for `embed_bytes`, which are gone now
+        self._stored_assets = set()
 
         # Output header
-        h = Template(_HEADER).substitute(title=self._name,
-                                         encoding=self._encoding)
-        self._output_html(h)
-
-        with open(dot_vz_fn, 'w') as f:
-            print('ok', file=f)
-
-    def _output_surrounding_html(self, prefix, suffix, *args, **kwargs):
-            #with open(os.path.join(self._root, 'index.html'), 'a') as f:
-        kwargs['file'] = self._cur_file
-        print(prefix, file=self._cur_file)
-        print(*args, **kwargs)
-        print(suffix, file=self._cur_file)
+        self._start_page()
 
     def _output_html(self, *args, **kwargs):
-        #with open(os.path.join(self._root, 'index.html'), 'a') as f:
-        kwargs['file'] = self._cur_file
-        print(*args, **kwargs)
+        self._emit(Entry.html(format_text(*args, **kwargs)))
+
+    def _emit(self, entry):
+        """
+        Appends an entry to the current page or tab.
+        """
+        if self._entry_queue is None:
+            self._write_entry(self._cur_file, entry)
+        else:
+            self._entry_queue.append((self._cur_file, entry))
+            if not self._writer_awake:
+                self._wake.set()
+
+    def _write_entry(self, target, entry):
+        target.append(entry)
+        if self._paginate and target is self._main_file:
+            # The first entry of a page is its header, which does not count
+            if ((self._page_entries is not None and
+                 target.count - 1 >= self._page_entries) or
+                    (self._page_bytes is not None and
+                     target.size >= self._page_bytes)):
+                self._next_page()
+
+    def render(self, renderers=None):
+        """
+        Renders the current page from its journal of logged entries. This can
+        be used to render the log with a different template. It requires the
+        log to be created with ``keep_journal=True``.
+
+        :param renderers: Dictionary from entry kinds (``'html'``, ``'tag'``,
+                          ``'items'``, ``'image'``, ``'figure'``, ``'tabs'``
+                          and ``'tiles'``) to functions that render them,
+                          overriding the default ones in
+                          `vzlog.journal.RENDERERS`.
+        :returns: The HTML of the page.
+        """
+        if not self._keep_journal:
+            raise ValueError('render requires the log to be created with '
+                             'keep_journal=True')
+        self._drain()
+        html = render_entries(self._main_file.journal, renderers)
+        if self._paginate:
+            html += self._page_nav()
+        return html + _FOOTER
 
     def _finalize(self):
-        self._output_html(_FOOTER)
-        self.flush()
-        if self._main_file:
-            self._main_file.close()
-            self._main_file = None
+        # At exit, the pool can no longer start threads or take jobs, so the
+        # remaining work, such as pending thumbnails, is done right here
+        self._workers = 0
+        self.close()
+
+    def close(self):
+        """
+        Writes all logged entries and closes the page, deleting the files
+        that held the contents of tabs. Nothing should be logged afterwards.
+        This is done at exit, so it is only needed in processes that exit
+        without running `atexit` handlers.
+        """
+        try:
+            self.flush()
+        finally:
+            if self._main_file:
+                self._main_file.close()
+                self._main_file = None
 
     def flush(self):
         """
@@ -181,8 +1010,16 @@ class VzLog:
         files. Normally, you do not need to call this yourself. However, it can
         be useful during an interactive session when the file rights have not
         be processed yet.
+
+        If images are written in the background, this waits for them to
+        finish and raises the first error that occurred while writing them.
         """
-        self._register_filename(os.path.join(self._root, 'index.html'))
+        self._drain()
+        self._update_thumbnails()
+        self._wait()
+        if self._main_file:
+            self._main_file.flush()
+        self._register_filename(os.path.join(self._root, self._page_fn))
         self._update_rights()
         self._set_rights(self._root)
 
@@ -196,9 +1033,7 @@ class VzLog:
         """
         Outputs strings surrounded by a specific HTML tag.
         """
-        opening = '<' + tag + '>'
-        closing = '</' + tag + '>'
-        self._output_surrounding_html(opening, closing, *args, **kwargs)
+        self._emit(Entry.tag(tag, format_text(*args, **kwargs)))
 
     def output(self, obj):
         """
@@ -252,6 +1087,9 @@ class VzLog:
                       list/tuple of values if you want different levels to have
                       different styles.
         """
+        self._emit(Entry.items(self._items_tree(items, style)))
+
+    def _items_tree(self, items, style):
         if isinstance(style, (list, tuple)) and style:
             st = style[0]
             if len(style) > 1:
@@ -271,16 +1109,13 @@ class VzLog:
         else:
             raise ValueError('Unknown list style')
 
-        self._output_html(open_tag)
+        children = []
         for item in items:
             if isinstance(item, list):
-                self.items(item, style=next_style)
+                children.append(self._items_tree(item, style=next_style))
             else:
-                self.output_with_tag('li', item)
-        self._output_html(close_tag)
-
-        #self._output_surrounding_html('<ul>', '</ul>',
-                #''.join('<li>{}</li>'.format(item) for item in items))
+                children.append(format_text(item))
+        return (open_tag, close_tag, children)
 
     def impath(self, ext='png', scale=1.0):
         """
@@ -304,23 +1139,75 @@ class VzLog:
         :param scale:   Scale of image when viewed in the browser. This will
                         use nearest neighbor upscaling that works well with
                         pixel grids (if your browser supports it).
+
+        Encoder options can be passed along when saving a grid:
+
+        >>> grid.save(vz.impath('png'), compress_level=0)
         """
-        fn = 'plot-{:04}.'.format(self._counter) + ext
-        self._counter += 1
+        path, thumb_path = self._add_image(ext, scale)
+        if thumb_path is not None:
+            self._queue_thumbnail(path, thumb_path)
+        return path
 
-        if scale != 1.0:
-            scale_str = ('width="{:.2f}%" height="{:.2f}%" '
-                         .format(scale * 100.0, scale * 100.0))
+    def _add_image(self, ext, scale):
+        """
+        Outputs an image and returns its path and the path of its thumbnail,
+        which is None if it should not have one.
+        """
+        fn = self._next_asset_name() + '.' + ext
+        lazy = self._thumbnails is not None
+        if lazy and ext.lower() in _THUMBNAIL_EXTS:
+            thumb_fn = _thumbnail_name(fn)
         else:
-            scale_str = ''
-
-        self._output_surrounding_html(
-            '<div><div class="wrapper">', '</div></div>', '<img src="{}" {}/>'.format(fn, scale_str))
+            thumb_fn = None
+        self._emit(Entry.image(fn, scale, thumb_fn, lazy))
 
         path = os.path.join(self._root, fn)
         self._register_filename(path)
-        # The file won't exist yet, but this can still update older files
-        self._update_rights()
+        if thumb_fn is None:
+            return path, None
+        thumb_path = os.path.join(self._root, thumb_fn)
+        self._register_filename(thumb_path)
+        return path, thumb_path
+
+    def image(self, im, ext='png', scale=1, **options):
+        """
+        Logs an image. Unlike `impath`, the encoding and writing is handled by
+        the log, in the background if it was created with `workers`. The
+        image is copied, so it is safe to modify it afterwards. Images are
+        encoded favoring speed over size, e.g. PNG files use compression
+        level 1.
+
+        >>> vz.image(grid, scale=3)
+
+        :param im: An array of shape ``(height, width)``,
+                   ``(height, width, 3)`` or ``(height, width, 4)``, either
+                   with values in [0, 1] or of type `np.uint8`. Image grids
+                   and PIL images are also accepted.
+        :param ext: Extension of image file, which selects the format, e.g.
+                    ``'png'``, ``'webp'`` or ``'jpg'``.
+        :param scale: Upscaling using nearest neighbor.
+        :param options: Options of the PIL encoder, such as
+                        ``compress_level`` for PNG or ``quality`` for JPEG,
+                        that override the fast defaults.
+        :returns: The path of the image file, or None if it is stored
+                  according to `embed_bytes`.
+        """
+        data = _as_array(im)
+        # The copy, and the upscaled 8-bit pixels made when it is encoded
+        nbytes = data.nbytes + int(data.size * scale ** 2)
+        if self._embed_bytes is not None:
+            # Submitted before the entry is emitted, so that the asset is
+            # already resolved if there are no workers
+            asset = _Asset()
+            self._submit(nbytes, self._store_assets, _encode_array,
+                         [(asset, ext)], data, scale, options)
+            self._emit(Entry.image(asset, 1.0))
+            return None
+
+        path, thumb_path = self._add_image(ext, 1.0)
+        self._submit(nbytes, _save_array, data, path, scale, options,
+                     thumb_path, self._thumbnails)
         return path
 
     def savefig(self, fig=None):
@@ -330,25 +1217,65 @@ class VzLog:
         be viewed directly in the browser next to a link to the PDF (so it can
         be downloaded).
 
+        The figure is rendered by the calling thread, and only written in
+        the background if the log has `workers`, so it can be modified or
+        closed right after this call.
+
         :param fig: If specified, this should a matplotlib figure object that
                     ``fig.savefig`` will be called on.
         """
         if fig is None:
-            import pylab as pl
-            fig = pl
-        base_fn = 'plot-{:04}'.format(self._counter)
-        self._counter += 1
-
-        self._output_surrounding_html(
-            '<div>', '</div>', """
-            <img src="{0}.svg" />
-            <div><a href="{0}.pdf">pdf</a></div>""".format(base_fn))
-
+            import matplotlib.pyplot as plt
+            fig = plt.gcf()
+        # pyplot figures are not thread-safe, and are usually changed or
+        # closed as soon as this returns
+        payloads = dict((ext, _encode_figure(fig, ext))
+                        for ext in ('svg', 'pdf'))
+        nbytes = sum(len(payload) for payload in payloads.values())
+        lazy = self._thumbnails is not None
+
+        if self._embed_bytes is not None:
+            svg, pdf = _Asset(), _Asset()
+            self._submit(nbytes, self._store_assets, payloads.get,
+                         [(svg, 'svg'), (pdf, 'pdf')])
+            self._emit(Entry.figure(svg, pdf, lazy=lazy))
+            return
+
+        base_fn = self._next_asset_name()
+        self._emit(Entry.figure(base_fn + '.svg', base_fn + '.pdf',
+                                lazy=lazy))
+
+        paths = []
         for ext in 'svg', 'pdf':
             path = os.path.join(self._root, '{}.{}'.format(base_fn, ext))
             self._register_filename(path)
-            fig.savefig(path)
-        self._update_rights()
+            paths.append(path)
+
+        self._submit(nbytes, _write_payloads, paths,
+                     [payloads['svg'], payloads['pdf']])
+
+    def tiles(self, grid, ext='png', **options):
+        """
+        Logs a `TiledImageGrid` as a tile pyramid, shown in a viewer that
+        pans by dragging and zooms by scrolling. The tiles are written in the
+        background if the log has `workers`, and the grid's data should not
+        be changed until then.
+
+        >>> vz.tiles(vzlog.image.TiledImageGrid(patches))
+
+        :param grid: The tiled image grid.
+        :param ext: Extension of the tile files.
+        :param options: Options of the PIL encoder.
+        """
+        base_fn = self._next_asset_name() + '.tiles'
+        self._emit(Entry.tiles(base_fn, grid._fullsize, grid.levels,
+                               grid._tile_size, ext))
+        path = os.path.join(self._root, base_fn)
+        self._submit(0, self._save_tiles, grid, path, ext, options)
+
+    def _save_tiles(self, grid, path, ext, options):
+        for tile_path in grid.save(path, format=ext, **options):
+            self._register_filename(tile_path)
 
     def tab(self, name):
         if self._tabs is None:
@@ -357,39 +1284,26 @@ class VzLog:
         if name in self._tabs:
             self._cur_file = self._tabs[name]
         else:
-            fp = StringIO()
-            self._tabs[name] = fp
-            self._cur_file = fp
+            # Tab contents are written to a file of their own as they are
+            # logged, and copied into the page by finalize_tabs
+            path = os.path.join(self._root, '.{}tab-{:04}.html'.format(
+                                self._asset_prefix, next(self._tab_ids)))
+            stream = _HTMLStream(path, '', encoding=self._encoding,
+                                 flush_seconds=None, keep_journal=False)
+            self._tabs[name] = stream
+            self._cur_file = stream
 
     def finalize_tabs(self):
         assert self._tabs is not None
+        # Tab contents are written by the writer thread, if there is one
+        self._drain()
         self._cur_file = self._main_file
 
-        self._output_html('<div class="tabs" id="tabs">')
-
-        # Print links
-        self._output_html('<ul>')
-        for no, (name, tab) in enumerate(self._tabs.items()):
-            self._output_html('<li><a href="#tabs-{no}">{name}</a></li>'.format(no=no+1, name=name))
-        self._output_html('</ul>')
-
-        # Output tab divs
-        for no, (name, tab) in enumerate(self._tabs.items()):
-            self._output_html('<div class="tab" id="tabs-{}">'.format(no+1))
-
-            self._output_html(tab.getvalue())
-            tab.close()
-
-            self._output_html('</div>')
-
-        self._output_html('</div>')
-        self._output_html('''
-          <script>
-          $(function() {
-            $("#tabs").tabs();
-          });
-          </script>
-        ''')
+        tabs = []
+        for name, stream in self._tabs.items():
+            stream.close()
+            tabs.append((name, stream.path))
+        self._emit(Entry.tabs(tabs, self._encoding))
 
         self._tabs = None
 